@@ -1,23 +1,38 @@
-from flask import Flask, render_template, request, jsonify, send_file, flash, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, send_file, flash, redirect, url_for
 from werkzeug.utils import secure_filename
+from werkzeug.http import http_date
 import os
-import pandas as pd
-from datetime import datetime, timedelta
+import xlsxwriter
+from datetime import date, datetime, time as dt_time, timedelta
 import io
+import mmap
 import zipfile
-from threading import Thread
+from threading import Condition, Lock, local
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import json
 import time
 import struct
 from dataclasses import dataclass
-from typing import List, Dict, Any
+from enum import IntEnum
+from typing import List, Dict, Any, Optional, Tuple
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, RotatingFileHandler
 import atexit
 from config import config
 import traceback
 import re
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+import functools
+from itertools import islice
+import hashlib
+import shutil
+import tempfile
+import uuid
+
 def create_app(config_name=None):
     """Factory function to create Flask app"""
     app = Flask(__name__)
@@ -29,25 +44,39 @@ def create_app(config_name=None):
     # Ensure directories exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
-    os.makedirs(app.config.get('LOG_FOLDER', 'logs'), exist_ok=True)
+    log_folder = app.config.get('LOG_FOLDER', 'logs')
+    os.makedirs(log_folder, exist_ok=True)
 
     # Setup logging for production
     if not app.debug and not app.testing:
-        if not os.path.exists('logs'):
-            os.mkdir('logs')
-        file_handler = RotatingFileHandler('logs/ddd_parser.log', maxBytes=10240000, backupCount=10)
+        file_handler = RotatingFileHandler(os.path.join(log_folder, 'ddd_parser.log'), maxBytes=10240000, backupCount=10)
         file_handler.setFormatter(logging.Formatter(
             '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
         ))
-        file_handler.setLevel(logging.INFO)
+        # LOG_LEVEL=WARNING wyłącza komunikaty INFO z pętli przetwarzania plików
+        # (wielkość liter bez znaczenia; nieznany poziom - INFO zamiast błędu przy starcie)
+        log_level_name = str(app.config.get('LOG_LEVEL', 'INFO')).strip().upper()
+        log_level = logging.getLevelName(log_level_name)
+        unknown_level = not isinstance(log_level, int)
+        if unknown_level:
+            log_level = logging.INFO
+        file_handler.setLevel(log_level)
         app.logger.addHandler(file_handler)
-        app.logger.setLevel(logging.INFO)
+        app.logger.setLevel(log_level)
+        if unknown_level:
+            app.logger.warning("Unknown LOG_LEVEL %r, using INFO", app.config.get('LOG_LEVEL'))
         app.logger.info('DDD Parser startup')
 
     return app
 
 app = create_app()
 
+# Rozmiar bufora przy zapisie przesłanych plików na dysk
+UPLOAD_COPY_BUFFER_SIZE = 1024 * 1024
+
+# Rozszerzenie plików tachografu (bez kopiowania nazwy przez lower())
+_DDD_RE = re.compile(r'\.ddd\Z', re.IGNORECASE)
+
 # Global variable to track processing status
 processing_status = {
     'active': False,
@@ -56,20 +85,47 @@ processing_status = {
     'current_file': '',
     'start_time': None,
     'errors': [],
-    'output_file': None
+    'output_file': None,
+    'job_id': None
 }
-
-@dataclass
+# Chroni processing_status przed jednoczesnym zapisem (wątek w tle) i odczytem (/status)
+_status_lock = Lock()
+# Budzi strumienie /events przy postępie (zapis statusu i tak trzyma _status_lock)
+_status_changed = Condition(_status_lock)
+
+# Co ile sekund zmienia się ETag aktywnego statusu (odświeżenie czasu i szacunku do końca)
+STATUS_ETAG_TIME_BUCKET_SECONDS = 5.0
+
+# Strumień /events: co ile sekund sprawdzić status i co ile wysłać komentarz podtrzymujący
+STATUS_EVENTS_POLL_SECONDS = 1.0
+STATUS_EVENTS_KEEPALIVE_SECONDS = 15.0
+
+def _status_snapshot() -> Dict[str, Any]:
+    """Zwraca spójną kopię statusu przetwarzania"""
+    with _status_lock:
+        snapshot = dict(processing_status)
+        snapshot['errors'] = list(processing_status['errors'])
+    return snapshot
+
+class ActivityType(IntEnum):
+    """Typ aktywności kierowcy (porównania na liczbach zamiast napisów)"""
+    DRIVING = 0
+    WORK = 1
+    AVAILABLE = 2
+    REST = 3
+    BREAK = 4
+
+@dataclass(slots=True)
 class DriverActivity:
     """Klasa reprezentująca aktywność kierowcy"""
     start_time: datetime
     end_time: datetime
-    activity_type: str  # 'driving', 'work', 'available', 'rest', 'break'
+    activity_type: ActivityType
     duration_minutes: int
     vehicle_speed: float = 0.0
     distance_km: float = 0.0
 
-@dataclass
+@dataclass(slots=True)
 class WorkShift:
     """Klasa reprezentująca zmianę pracy"""
     driver_name: str
@@ -81,36 +137,178 @@ class WorkShift:
     total_rest_time: int = 0
     total_distance: float = 0.0
 
+# Typy aktywności z tacho_parser -> ActivityType (nieznane traktowane jako praca)
+ACTIVITY_TYPE_MAPPING = {
+    'driving': ActivityType.DRIVING,
+    'work': ActivityType.WORK,
+    'available': ActivityType.AVAILABLE,
+    'rest': ActivityType.REST,
+    'break': ActivityType.BREAK,
+    'unknown': ActivityType.WORK
+}
+
+# Przykładowa zmiana 8-godzinna od 6:00: (początek, koniec, typ, minuty, prędkość, dystans)
+SAMPLE_ACTIVITY_TEMPLATE = (
+    (timedelta(0), timedelta(minutes=90), ActivityType.DRIVING, 90, 75.0, 112.5),
+    (timedelta(minutes=90), timedelta(minutes=135), ActivityType.BREAK, 45, 0.0, 0.0),
+    (timedelta(minutes=135), timedelta(minutes=255), ActivityType.DRIVING, 120, 80.0, 160.0),
+    (timedelta(minutes=255), timedelta(minutes=285), ActivityType.REST, 30, 0.0, 0.0),
+    (timedelta(minutes=285), timedelta(minutes=465), ActivityType.DRIVING, 180, 70.0, 210.0),
+)
+
+# Formaty czasu aktywności zwracane przez tacho_parser:
+# '%Y-%m-%d %H:%M:%S' oraz sama godzina '%H:%M:%S' / '%H:%M'
+_DATETIME_RE = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2}) (\d{1,2}):(\d{1,2}):(\d{1,2})', re.ASCII)
+_TIME_ONLY_RE = re.compile(r'(\d{1,2}):(\d{1,2})(?::(\d{1,2}))?', re.ASCII)
+
+@functools.lru_cache(maxsize=4096)
+def _parse_date_cached(value: str, fmt: str) -> datetime:
+    """strptime z pamięcią podręczną - daty w nazwach plików często się powtarzają"""
+    return datetime.strptime(value, fmt)
+
+@functools.lru_cache(maxsize=4096)
+def _parse_time_cached(time_str: str):
+    """Parsuje napis czasu; zwraca datetime (pełna data), time (sama godzina) lub None"""
+    try:
+        # Spacja oznacza pełną datę - format godziny i tak nie może pasować
+        if ' ' in time_str:
+            match = _DATETIME_RE.fullmatch(time_str)
+            if match:
+                return datetime(*map(int, match.groups()))
+        else:
+            match = _TIME_ONLY_RE.fullmatch(time_str)
+            if match:
+                hour, minute, second = match.groups()
+                return dt_time(int(hour), int(minute), int(second or 0))
+    except ValueError:
+        # Wartości spoza zakresu (np. 25:00)
+        pass
+    return None
+
+# Wzorce dat szukane w nazwie pliku, gdy format nazwy nie jest rozpoznany
+# (każdy wzorzec może pasować tylko do jednego formatu strptime)
+_FILENAME_DATE_PATTERNS = (
+    (re.compile(r'\d{8}'), '%Y%m%d'),  # YYYYMMDD
+    (re.compile(r'\d{4}-\d{2}-\d{2}'), '%Y-%m-%d'),  # YYYY-MM-DD
+    (re.compile(r'\d{2}-\d{2}-\d{4}'), '%d-%m-%Y'),  # DD-MM-YYYY
+)
+
+@functools.lru_cache(maxsize=4096)
+def _parse_filename_cached(filename: str) -> Tuple[Optional[datetime], Optional[str], Optional[str]]:
+    """Czyste parsowanie nazwy pliku .DDD; zwraca (data, kierowca, pojazd)"""
+    date_value = None
+    driver_name = None
+    vehicle_id = None
+
+    # Usuń rozszerzenie - tylko z końca nazwy i bez względu na wielkość liter
+    # (X_Nowak.Ddd -> X_Nowak; ".DDD" w środku nazwy zostaje)
+    base_name = filename[:-4] if _DDD_RE.search(filename) else filename
+    parts = base_name.split('_')
+
+    # Format 1: C_20250502_0856_K_Kudrzycki_1700518095760002
+    if len(parts) >= 5:
+        # Data z pozycji 1
+        if len(parts[1]) == 8 and parts[1].isdigit():
+            try:
+                date_value = _parse_date_cached(parts[1], '%Y%m%d')
+            except ValueError:
+                pass
+
+        # Imię i nazwisko - szukaj części które nie są liczbami
+        name_parts = []
+        for i in range(3, len(parts)):
+            part = parts[i]
+            # Pomiń części które wyglądają na kody/liczby
+            if not part.isdigit() and len(part) > 1:
+                # Dodaj tylko jeśli nie wygląda na timestamp
+                if len(part) < 15:  # Timestamps są długie
+                    name_parts.append(part)
+
+        if name_parts:
+            driver_name = " ".join(name_parts)
+
+        # Vehicle ID z pierwszej części
+        if len(parts) > 0:
+            vehicle_id = f"{parts[0]}_{parts[3] if len(parts) > 3 else 'VEH'}"
+
+    # Format 2: Inne formaty
+    elif len(parts) >= 3:
+        # Szukaj daty w różnych pozycjach
+        for part in parts:
+            if len(part) == 8 and part.isdigit():
+                try:
+                    date_value = _parse_date_cached(part, '%Y%m%d')
+                    break
+                except ValueError:
+                    pass
+
+        # Szukaj imion (części które nie są liczbami i mają odpowiednią długość)
+        name_candidates = [p for p in parts if not p.isdigit() and 2 <= len(p) <= 20]
+        if name_candidates:
+            driver_name = " ".join(name_candidates[:2])  # Max 2 części dla imienia
+
+    # Fallback - próbuj wyciągnąć datę z różnych formatów
+    if not date_value:
+        for pattern, fmt in _FILENAME_DATE_PATTERNS:
+            match = pattern.search(filename)
+            if match:
+                try:
+                    date_value = _parse_date_cached(match.group(), fmt)
+                    break
+                except ValueError:
+                    continue
+
+    return date_value, driver_name, vehicle_id
+
 class DDDParser:
     """Uproszczony parser plików .DDD z obsługą Smart Tacho V2"""
 
     def __init__(self):
         self.logger = logging.getLogger(__name__)
+        # TachoParser trzyma stan parsowania w self (raw_data, _section_offsets),
+        # więc każdy wątek (równoległe partie, MAX_JOB_WORKERS > 1) ma własną instancję
+        self._thread_state = local()
+
+    def _get_tacho_parser(self):
+        """Zwraca (leniwie tworzony) parser z tacho_lib dla bieżącego wątku"""
+        parser = getattr(self._thread_state, 'tacho_parser', None)
+        if parser is None:
+            from tacho_lib import tacho_parser
+            parser = self._thread_state.tacho_parser = tacho_parser.TachoParser()
+        return parser
 
     def parse_ddd_file(self, file_path: str) -> WorkShift:
         """Parsuje plik .DDD i zwraca WorkShift"""
         try:
             with open(file_path, 'rb') as file:
-                raw_data = file.read()
+                # Pustego pliku nie da się zmapować
+                if os.fstat(file.fileno()).st_size == 0:
+                    return self._parse_raw_data(b'', file_path)
 
-            # Importuj parser z tacho_lib
-            try:
-                from tacho_lib import tacho_parser
-                parser = tacho_parser.TachoParser()
-                parsed_data = parser.parse(raw_data)
+                # mmap udostępnia plik bez kopiowania całej zawartości do pamięci procesu
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as raw_data:
+                    # Asynchroniczny odczyt z wyprzedzeniem - I/O nakłada się na parsowanie
+                    if hasattr(mmap, 'MADV_WILLNEED'):
+                        raw_data.madvise(mmap.MADV_WILLNEED)
+                    return self._parse_raw_data(raw_data, file_path)
 
-                # Konwertuj sparsowane dane na WorkShift
-                return self._convert_to_workshift(parsed_data, file_path)
+        except Exception as e:
+            self.logger.error(f"Błąd parsowania {file_path}: {str(e)}")
+            return self._create_fallback_workshift(file_path)
 
-            except ImportError as e:
-                self.logger.error(f"Cannot import tacho_parser: {e}")
-                return self._create_fallback_workshift(file_path)
-            except Exception as e:
-                self.logger.warning(f"Tacho parser failed, using fallback: {e}")
-                return self._create_fallback_workshift(file_path)
+    def _parse_raw_data(self, raw_data, file_path: str) -> WorkShift:
+        """Parsuje dane .DDD (bytes lub mmap) i zwraca WorkShift"""
+        try:
+            parsed_data = self._get_tacho_parser().parse(raw_data)
+
+            # Konwertuj sparsowane dane na WorkShift
+            return self._convert_to_workshift(parsed_data, file_path)
 
+        except ImportError as e:
+            self.logger.error(f"Cannot import tacho_parser: {e}")
+            return self._create_fallback_workshift(file_path)
         except Exception as e:
-            self.logger.error(f"Błąd parsowania {file_path}: {str(e)}")
+            self.logger.warning(f"Tacho parser failed, using fallback: {e}")
             return self._create_fallback_workshift(file_path)
 
     def _convert_to_workshift(self, parsed_data: Dict, file_path: str) -> WorkShift:
@@ -180,76 +378,11 @@ class DDDParser:
         }
 
         try:
-            # Usuń rozszerzenie
-            base_name = filename.replace('.DDD', '').replace('.ddd', '')
-            parts = base_name.split('_')
+            self.logger.info("Parsing filename: %s", filename)
 
-            self.logger.info(f"Parsing filename: {filename}, parts: {parts}")
+            result['date'], result['driver_name'], result['vehicle_id'] = _parse_filename_cached(filename)
 
-            # Format 1: C_20250502_0856_K_Kudrzycki_1700518095760002
-            if len(parts) >= 5:
-                # Data z pozycji 1
-                if len(parts[1]) == 8 and parts[1].isdigit():
-                    try:
-                        result['date'] = datetime.strptime(parts[1], '%Y%m%d')
-                    except ValueError:
-                        pass
-
-                # Imię i nazwisko - szukaj części które nie są liczbami
-                name_parts = []
-                for i in range(3, len(parts)):
-                    part = parts[i]
-                    # Pomiń części które wyglądają na kody/liczby
-                    if not part.isdigit() and len(part) > 1 and not re.match(r'^\d+$', part):
-                        # Dodaj tylko jeśli nie wygląda na timestamp
-                        if len(part) < 15:  # Timestamps są długie
-                            name_parts.append(part)
-
-                if name_parts:
-                    result['driver_name'] = " ".join(name_parts)
-
-                # Vehicle ID z pierwszej części
-                if len(parts) > 0:
-                    result['vehicle_id'] = f"{parts[0]}_{parts[3] if len(parts) > 3 else 'VEH'}"
-
-            # Format 2: Inne formaty
-            elif len(parts) >= 3:
-                # Szukaj daty w różnych pozycjach
-                for part in parts:
-                    if len(part) == 8 and part.isdigit():
-                        try:
-                            result['date'] = datetime.strptime(part, '%Y%m%d')
-                            break
-                        except ValueError:
-                            pass
-
-                # Szukaj imion (części które nie są liczbami i mają odpowiednią długość)
-                name_candidates = [p for p in parts if not p.isdigit() and 2 <= len(p) <= 20]
-                if name_candidates:
-                    result['driver_name'] = " ".join(name_candidates[:2])  # Max 2 części dla imienia
-
-            # Fallback - próbuj wyciągnąć datę z różnych formatów
-            if not result['date']:
-                date_patterns = [
-                    r'(\d{8})',  # YYYYMMDD
-                    r'(\d{4}-\d{2}-\d{2})',  # YYYY-MM-DD
-                    r'(\d{2}-\d{2}-\d{4})',  # DD-MM-YYYY
-                ]
-
-                for pattern in date_patterns:
-                    match = re.search(pattern, filename)
-                    if match:
-                        date_str = match.group(1)
-                        for fmt in ['%Y%m%d', '%Y-%m-%d', '%d-%m-%Y']:
-                            try:
-                                result['date'] = datetime.strptime(date_str, fmt)
-                                break
-                            except ValueError:
-                                continue
-                        if result['date']:
-                            break
-
-            self.logger.info(f"Parsed filename result: {result}")
+            self.logger.info("Parsed filename result: %s", result)
 
         except Exception as e:
             self.logger.warning(f"Error in advanced filename parsing: {e}")
@@ -259,11 +392,12 @@ class DDDParser:
     def _generate_activities_from_parsed(self, parsed_data: Dict, shift_date: datetime) -> List[DriverActivity]:
         """Generuje aktywności na podstawie sparsowanych danych"""
         activities = []
+        append_activity = activities.append
 
         try:
             if isinstance(parsed_data, dict) and 'activities' in parsed_data and parsed_data['activities']:
-                # Użyj rzeczywistych danych aktywności
-                for activity_data in parsed_data['activities'][:20]:  # Limit 20 aktywności
+                # Użyj rzeczywistych danych aktywności (bez kopiowania listy)
+                for activity_data in islice(parsed_data['activities'], 20):  # Limit 20 aktywności
                     if isinstance(activity_data, dict) and 'error' not in activity_data:
                         try:
                             start_time = self._parse_time_string(activity_data.get('start_time', ''), shift_date)
@@ -272,16 +406,7 @@ class DDDParser:
                             activity_type = activity_data.get('activity_type', 'unknown')
 
                             # Mapuj typy aktywności
-                            activity_type_mapping = {
-                                'driving': 'driving',
-                                'work': 'work',
-                                'available': 'available',
-                                'rest': 'rest',
-                                'break': 'break',
-                                'unknown': 'work'
-                            }
-
-                            mapped_type = activity_type_mapping.get(activity_type, 'work')
+                            mapped_type = ACTIVITY_TYPE_MAPPING.get(activity_type, ActivityType.WORK)
 
                             activity = DriverActivity(
                                 start_time=start_time,
@@ -291,7 +416,7 @@ class DDDParser:
                                 vehicle_speed=float(activity_data.get('vehicle_speed', 0)),
                                 distance_km=float(activity_data.get('distance_km', 0))
                             )
-                            activities.append(activity)
+                            append_activity(activity)
 
                         except Exception as e:
                             self.logger.warning(f"Error parsing activity: {e}")
@@ -311,17 +436,12 @@ class DDDParser:
         """Parsuje string czasu do datetime"""
         try:
             if time_str and time_str != "N/A":
-                # Spróbuj różne formaty
-                formats = ['%Y-%m-%d %H:%M:%S', '%H:%M:%S', '%H:%M']
-                for fmt in formats:
-                    try:
-                        if ' ' in time_str:
-                            return datetime.strptime(time_str, fmt)
-                        else:
-                            time_part = datetime.strptime(time_str, fmt).time()
-                            return datetime.combine(base_date.date(), time_part)
-                    except:
-                        continue
+                # Format dopasowany raz dla każdego różnego napisu
+                parsed = _parse_time_cached(time_str)
+                if isinstance(parsed, datetime):
+                    return parsed
+                if parsed is not None:
+                    return datetime.combine(base_date.date(), parsed)
         except:
             pass
 
@@ -330,69 +450,33 @@ class DDDParser:
 
     def _generate_sample_activities(self, shift_date: datetime) -> List[DriverActivity]:
         """Generuje przykładowe aktywności dla demonstracji"""
-        activities = []
-        current_time = shift_date.replace(hour=6, minute=0, second=0)
-
-        # Przykładowa zmiana 8-godzinna
-        activities.append(DriverActivity(
-            start_time=current_time,
-            end_time=current_time + timedelta(hours=1, minutes=30),
-            activity_type='driving',
-            duration_minutes=90,
-            vehicle_speed=75.0,
-            distance_km=112.5
-        ))
-
-        current_time += timedelta(hours=1, minutes=30)
-        activities.append(DriverActivity(
-            start_time=current_time,
-            end_time=current_time + timedelta(minutes=45),
-            activity_type='break',
-            duration_minutes=45
-        ))
-
-        current_time += timedelta(minutes=45)
-        activities.append(DriverActivity(
-            start_time=current_time,
-            end_time=current_time + timedelta(hours=2),
-            activity_type='driving',
-            duration_minutes=120,
-            vehicle_speed=80.0,
-            distance_km=160.0
-        ))
-
-        current_time += timedelta(hours=2)
-        activities.append(DriverActivity(
-            start_time=current_time,
-            end_time=current_time + timedelta(minutes=30),
-            activity_type='rest',
-            duration_minutes=30
-        ))
-
-        current_time += timedelta(minutes=30)
-        activities.append(DriverActivity(
-            start_time=current_time,
-            end_time=current_time + timedelta(hours=3),
-            activity_type='driving',
-            duration_minutes=180,
-            vehicle_speed=70.0,
-            distance_km=210.0
-        ))
-
-        return activities
+        base_time = shift_date.replace(hour=6, minute=0, second=0)
+        return [
+            DriverActivity(base_time + start, base_time + end, activity_type, duration, speed, distance)
+            for start, end, activity_type, duration, speed, distance in SAMPLE_ACTIVITY_TEMPLATE
+        ]
 
     def _calculate_totals(self, workshift: WorkShift):
-        """Oblicza sumy czasów i dystansu"""
-        workshift.total_driving_time = sum(
-            a.duration_minutes for a in workshift.activities if a.activity_type == 'driving'
-        )
-        workshift.total_work_time = sum(
-            a.duration_minutes for a in workshift.activities if a.activity_type in ['driving', 'work']
-        )
-        workshift.total_rest_time = sum(
-            a.duration_minutes for a in workshift.activities if a.activity_type in ['rest', 'break']
-        )
-        workshift.total_distance = sum(a.distance_km for a in workshift.activities)
+        """Oblicza sumy czasów i dystansu w jednym przebiegu po aktywnościach"""
+        driving_time = work_time = rest_time = 0
+        distance = 0.0
+
+        for a in workshift.activities:
+            activity_type = a.activity_type
+            duration = a.duration_minutes
+            if activity_type == ActivityType.DRIVING:
+                driving_time += duration
+                work_time += duration
+            elif activity_type == ActivityType.WORK:
+                work_time += duration
+            elif activity_type >= ActivityType.REST:
+                rest_time += duration
+            distance += a.distance_km
+
+        workshift.total_driving_time = driving_time
+        workshift.total_work_time = work_time
+        workshift.total_rest_time = rest_time
+        workshift.total_distance = distance
 
     def _create_fallback_workshift(self, file_path: str) -> WorkShift:
         """Tworzy podstawowy workshift z parsowania nazwy pliku - ulepszona wersja"""
@@ -406,7 +490,7 @@ class DDDParser:
             vehicle_id = parsed['vehicle_id'] or f"VEH_{filename[:10]}"
             shift_date = parsed['date'] or datetime.now()
 
-            self.logger.info(f"Fallback workshift - date: {shift_date}, driver: {driver_name}, vehicle: {vehicle_id}")
+            self.logger.info("Fallback workshift - date: %s, driver: %s, vehicle: %s", shift_date, driver_name, vehicle_id)
 
         except Exception as e:
             self.logger.warning(f"Error in fallback parsing for {filename}: {e}")
@@ -427,83 +511,214 @@ class DDDParser:
         self._calculate_totals(workshift)
         return workshift
 
+# Polskie nazwy typów aktywności w raportach
+# (indeksowane wartością ActivityType)
+ACTIVITY_NAMES = ('Jazda', 'Praca', 'Dostępność', 'Odpoczynek', 'Przerwa')
+
+def _activity_name(activity_type: ActivityType) -> str:
+    """Konwertuje typ aktywności na polską nazwę"""
+    return ACTIVITY_NAMES[activity_type]
+
+def _format_hhmm(value: datetime) -> str:
+    """Formatuje godzinę jako HH:MM (szybciej niż strftime dla każdego wiersza)"""
+    return f"{value.hour:02d}:{value.minute:02d}"
+
 class WorkshiftGenerator:
     """Generator raportów workshiftów"""
 
+    # Nagłówki arkuszy raportu
+    WORKSHIFT_HEADERS = (
+        'Data', 'Kierowca', 'Pojazd', 'Czas rozpoczęcia', 'Czas zakończenia',
+        'Typ aktywności', 'Czas trwania (min)', 'Prędkość średnia (km/h)', 'Dystans (km)'
+    )
+    SUMMARY_HEADERS = (
+        'Data', 'Kierowca', 'Pojazd', 'Czas jazdy (h)', 'Czas pracy (h)',
+        'Czas odpoczynku (h)', 'Dystans całkowity (km)'
+    )
+
     def generate_excel_report(self, workshifts: List[WorkShift], output_path: str):
         """Generuje raport Excel z workshiftami"""
 
-        # Przygotuj dane dla DataFrame
-        data = []
-        for ws in workshifts:
-            for activity in ws.activities:
-                data.append({
-                    'Data': ws.date.strftime('%Y-%m-%d'),
-                    'Kierowca': ws.driver_name,
-                    'Pojazd': ws.vehicle_id,
-                    'Czas rozpoczęcia': activity.start_time.strftime('%H:%M'),
-                    'Czas zakończenia': activity.end_time.strftime('%H:%M'),
-                    'Typ aktywności': self._get_activity_name(activity.activity_type),
-                    'Czas trwania (min)': activity.duration_minutes,
-                    'Prędkość średnia (km/h)': round(activity.vehicle_speed, 1),
-                    'Dystans (km)': round(activity.distance_km, 2)
-                })
-
-        if not data:
-            # Jeśli brak danych, stwórz pusty DataFrame
-            data = [{
-                'Data': datetime.now().strftime('%Y-%m-%d'),
-                'Kierowca': 'Brak danych',
-                'Pojazd': 'Brak danych',
-                'Czas rozpoczęcia': '00:00',
-                'Czas zakończenia': '00:00',
-                'Typ aktywności': 'Brak danych',
-                'Czas trwania (min)': 0,
-                'Prędkość średnia (km/h)': 0,
-                'Dystans (km)': 0
-            }]
-
-        df = pd.DataFrame(data)
-
-        # Utwórz plik Excel z formatowaniem
-        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Workshifts', index=False)
+        # constant_memory zapisuje każdy wiersz na dysk od razu - pamięć nie rośnie z liczbą wierszy
+        with xlsxwriter.Workbook(output_path, {'constant_memory': True}) as workbook:
+            header_format = workbook.add_format({'bold': True})
+
+            ws_sheet = workbook.add_worksheet('Workshifts')
+            ws_sheet.write_row(0, 0, self.WORKSHIFT_HEADERS, header_format)
+
+            # Lokalne referencje - pętla wykonuje się raz na każdą aktywność
+            write_row = ws_sheet.write_row
+            activity_name = _activity_name
+
+            row_idx = 1
+            for ws in workshifts:
+                ws_date = ws.date.strftime('%Y-%m-%d')
+                driver_name = ws.driver_name
+                vehicle_id = ws.vehicle_id
+                for activity in ws.activities:
+                    write_row(row_idx, 0, (
+                        ws_date,
+                        driver_name,
+                        vehicle_id,
+                        _format_hhmm(activity.start_time),
+                        _format_hhmm(activity.end_time),
+                        activity_name(activity.activity_type),
+                        activity.duration_minutes,
+                        round(activity.vehicle_speed, 1),
+                        round(activity.distance_km, 2)
+                    ))
+                    row_idx += 1
+
+            if row_idx == 1:
+                # Jeśli brak danych, zapisz wiersz zastępczy
+                write_row(1, 0, (
+                    datetime.now().strftime('%Y-%m-%d'), 'Brak danych', 'Brak danych',
+                    '00:00', '00:00', 'Brak danych', 0, 0, 0
+                ))
 
             # Dodaj arkusz podsumowania
-            summary_data = self._create_summary(workshifts)
-            summary_df = pd.DataFrame(summary_data)
-            summary_df.to_excel(writer, sheet_name='Podsumowanie', index=False)
-
-    def _get_activity_name(self, activity_type: str) -> str:
-        """Konwertuje typ aktywności na polską nazwę"""
-        names = {
-            'driving': 'Jazda',
-            'work': 'Praca',
-            'available': 'Dostępność',
-            'rest': 'Odpoczynek',
-            'break': 'Przerwa'
-        }
-        return names.get(activity_type, activity_type)
+            summary_sheet = workbook.add_worksheet('Podsumowanie')
+            summary_sheet.write_row(0, 0, self.SUMMARY_HEADERS, header_format)
+            for row_idx, row in enumerate(self._create_summary(workshifts), start=1):
+                summary_sheet.write_row(row_idx, 0, row)
 
-    def _create_summary(self, workshifts: List[WorkShift]) -> List[Dict]:
-        """Tworzy dane podsumowania"""
+    def _create_summary(self, workshifts: List[WorkShift]) -> List[tuple]:
+        """Tworzy wiersze podsumowania"""
         summary = []
         for ws in workshifts:
-            summary.append({
-                'Data': ws.date.strftime('%Y-%m-%d'),
-                'Kierowca': ws.driver_name,
-                'Pojazd': ws.vehicle_id,
-                'Czas jazdy (h)': round(ws.total_driving_time / 60, 2) if ws.total_driving_time else 0,
-                'Czas pracy (h)': round(ws.total_work_time / 60, 2) if ws.total_work_time else 0,
-                'Czas odpoczynku (h)': round(ws.total_rest_time / 60, 2) if ws.total_rest_time else 0,
-                'Dystans całkowity (km)': round(ws.total_distance, 2) if ws.total_distance else 0
-            })
-        return summary if summary else [{'Data': 'Brak danych', 'Kierowca': 'Brak danych', 'Pojazd': 'Brak danych', 'Czas jazdy (h)': 0, 'Czas pracy (h)': 0, 'Czas odpoczynku (h)': 0, 'Dystans całkowity (km)': 0}]
+            summary.append((
+                ws.date.strftime('%Y-%m-%d'),
+                ws.driver_name,
+                ws.vehicle_id,
+                round(ws.total_driving_time / 60, 2) if ws.total_driving_time else 0,
+                round(ws.total_work_time / 60, 2) if ws.total_work_time else 0,
+                round(ws.total_rest_time / 60, 2) if ws.total_rest_time else 0,
+                round(ws.total_distance, 2) if ws.total_distance else 0
+            ))
+        return summary if summary else [('Brak danych', 'Brak danych', 'Brak danych', 0, 0, 0, 0)]
 
 # Inicjalizacja parserów
 ddd_parser = DDDParser()
 workshift_generator = WorkshiftGenerator()
 
+# Stały wątek dla zadań przetwarzania - kolejne partie czekają w kolejce executora
+_job_pool = ThreadPoolExecutor(max_workers=app.config.get('MAX_JOB_WORKERS', 1), thread_name_prefix='ddd-job')
+atexit.register(_job_pool.shutdown)
+
+class _WorkerLogHandler(QueueHandler):
+    """Zbiera logi procesu roboczego w pamięci - do pliku zapisuje je tylko proces główny"""
+
+    def __init__(self):
+        super().__init__(None)
+        self.records = []
+
+    def enqueue(self, record):
+        # prepare() (w emit) zamienia argumenty i wyjątek na gotowy napis - rekord da się zserializować
+        self.records.append(record)
+
+# Ustawiany tylko w procesach roboczych puli (_init_parse_worker)
+_worker_log_handler = None
+
+def _init_parse_worker():
+    """Inicjalizacja procesu roboczego: bez odziedziczonych handlerów (np. RotatingFileHandler)"""
+    global _worker_log_handler
+    _worker_log_handler = _WorkerLogHandler()
+    for logger in logging.Logger.manager.loggerDict.values():
+        if isinstance(logger, logging.Logger):
+            logger.handlers.clear()
+    logging.getLogger().handlers[:] = [_worker_log_handler]
+
+def _parse_file_in_worker(file_path: str) -> Tuple[WorkShift, list]:
+    """Parsuje plik w procesie roboczym, używając jego własnej instancji ddd_parser.
+
+    Zwraca (workshift, rekordy logów) - logi procesu roboczego zapisuje proces główny.
+    """
+    workshift = ddd_parser.parse_ddd_file(file_path)
+    if _worker_log_handler is None:
+        # Parsowanie w bieżącym procesie - logi zostały już zapisane
+        return workshift, []
+    records, _worker_log_handler.records = _worker_log_handler.records, []
+    return workshift, records
+
+def _start_parse_jobs(file_paths: List[str]):
+    """Zleca parsowanie plików; zwraca (executor, iterator par (indeks pliku, future))
+
+    Pary pojawiają się w kolejności ukończenia - postęp liczony jest po każdym pliku.
+    """
+    # Parsowanie plików jest niezależne i obciąża CPU - procesy omijają GIL.
+    # Dla kilku plików start puli kosztuje więcej niż samo parsowanie.
+    if len(file_paths) >= app.config.get('PARALLEL_MIN_FILES', 4):
+        max_workers = min(len(file_paths), app.config.get('MAX_WORKERS') or os.cpu_count() or 1)
+        executor = None
+        try:
+            executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_parse_worker)
+            futures = {executor.submit(_parse_file_in_worker, file_path): index
+                       for index, file_path in enumerate(file_paths)}
+            return executor, ((futures[future], future) for future in as_completed(futures))
+        except (OSError, RuntimeError) as e:
+            # Nie da się uruchomić procesów (limit procesów, BrokenProcessPool) - parsowanie w bieżącym procesie
+            app.logger.warning(f"Process pool unavailable, parsing inline: {e}")
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    # Generator - każdy plik parsowany dopiero, gdy pętla odbierająca wyniki do niego dojdzie
+    executor = _InlineExecutor()
+    return executor, ((index, executor.submit(_parse_file_in_worker, file_path))
+                      for index, file_path in enumerate(file_paths))
+
+class _InlineExecutor:
+    """Wykonuje zadania od razu w bieżącym procesie (małe partie - bez kosztu startu puli)"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+def _date_from_filename(filename: str):
+    """Zwraca datę zakodowaną w nazwie pliku .DDD (lub None)"""
+    return ddd_parser._parse_filename_advanced(filename)['date']
+
+def _orjson_default(value):
+    """Serializuje daty jak domyślny provider JSON Flaska (format HTTP)"""
+    if isinstance(value, (datetime, date)):
+        return http_date(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def fast_jsonify(data):
+    """jsonify przez orjson (jeśli jest zainstalowany)"""
+    if orjson is None:
+        return jsonify(data)
+    body = orjson.dumps(data, default=_orjson_default,
+                        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+    return app.response_class(body, mimetype='application/json')
+
+def _json_dumps(data) -> str:
+    """Serializacja JSON do napisu w tym samym formacie co fast_jsonify"""
+    if orjson is None:
+        return app.json.dumps(data)
+    return orjson.dumps(data, default=_orjson_default,
+                        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+def _upload_size(file) -> int:
+    """Rozmiar przesłanego pliku bez wczytywania jego zawartości"""
+    if file.content_length:
+        return file.content_length
+    stream = file.stream
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
 @app.route('/')
 def index():
     """Strona główna"""
@@ -524,59 +739,50 @@ def upload_files():
 
     try:
         # Sprawdź czy przetwarzanie już aktywne
-        if processing_status['active']:
+        with _status_lock:
+            already_active = processing_status['active']
+        if already_active:
             app.logger.warning("Processing already active")
-            return jsonify({'error': 'Przetwarzanie już w toku'}), 409
+            return fast_jsonify({'error': 'Przetwarzanie już w toku'}), 409
 
-        # Elastyczne wyszukiwanie plików w request
+        # Zbierz pliki spod wszystkich pól formularza (files, files[], file, upload, ...)
         files = []
-
-        # Sprawdź różne możliwe nazwy pól
-        possible_keys = ['files', 'files[]', 'file', 'upload', 'ddd_files']
-        for key in possible_keys:
-            if key in request.files:
-                files_from_key = request.files.getlist(key)
-                files.extend(files_from_key)
-                app.logger.info(f"Found {len(files_from_key)} files under key '{key}'")
-
-        # Jeśli nie znaleziono przez standardowe klucze, sprawdź wszystkie
-        if not files:
-            for key in request.files.keys():
-                files_from_key = request.files.getlist(key)
-                files.extend(files_from_key)
-                app.logger.info(f"Found {len(files_from_key)} files under key '{key}' (fallback)")
+        for key in request.files:
+            files_from_key = request.files.getlist(key)
+            files.extend(files_from_key)
+            app.logger.info(f"Found {len(files_from_key)} files under key '{key}'")
 
         app.logger.info(f"Total files found: {len(files)}")
 
         if not files:
             app.logger.error("No files found in request")
-            return jsonify({'error': 'Brak plików w żądaniu'}), 400
+            return fast_jsonify({'error': 'Brak plików w żądaniu'}), 400
 
         # Filtruj puste pliki i sprawdź nazwy
         valid_files = []
         for file in files:
             if file and file.filename and file.filename.strip():
                 valid_files.append(file)
-                app.logger.info(f"Valid file: {file.filename} (size: {len(file.read())} bytes)")
-                file.seek(0)  # Reset file pointer
+                if app.logger.isEnabledFor(logging.INFO):
+                    app.logger.info("Valid file: %s (size: %s bytes)", file.filename, _upload_size(file))
 
         if not valid_files:
             app.logger.error("No valid files (all empty or without names)")
-            return jsonify({'error': 'Wszystkie pliki są puste lub bez nazwy'}), 400
+            return fast_jsonify({'error': 'Wszystkie pliki są puste lub bez nazwy'}), 400
 
         # Sprawdź rozszerzenia .DDD
         ddd_files = []
         for file in valid_files:
-            filename_lower = file.filename.lower()
-            if filename_lower.endswith('.ddd'):
+            original_name = file.filename
+            if _DDD_RE.search(original_name):
                 ddd_files.append(file)
-                app.logger.info(f"DDD file accepted: {file.filename}")
+                app.logger.info("DDD file accepted: %s", original_name)
             else:
-                app.logger.warning(f"File rejected (not .DDD): {file.filename}")
+                app.logger.warning("File rejected (not .DDD): %s", original_name)
 
         if not ddd_files:
             app.logger.error("No .DDD files found")
-            return jsonify({'error': 'Brak plików .DDD w przesłanych plikach'}), 400
+            return fast_jsonify({'error': 'Brak plików .DDD w przesłanych plikach'}), 400
 
         # Pobierz filtry dat
         start_date = request.form.get('start_date', '').strip()
@@ -595,11 +801,16 @@ def upload_files():
                 parsed_end = datetime.strptime(end_date, '%Y-%m-%d')
         except ValueError as e:
             app.logger.error(f"Date parsing error: {e}")
-            return jsonify({'error': f'Nieprawidłowy format daty: {str(e)}'}), 400
+            return fast_jsonify({'error': f'Nieprawidłowy format daty: {str(e)}'}), 400
 
         # Zapisz pliki na dysku
         uploaded_files = []
         upload_errors = []
+        upload_folder = app.config['UPLOAD_FOLDER']
+
+        # Każda partia trafia do własnego katalogu - sprzątanie to jeden rmtree
+        os.makedirs(upload_folder, exist_ok=True)
+        batch_folder = tempfile.mkdtemp(prefix='batch_', dir=upload_folder)
 
         for file in ddd_files:
             try:
@@ -607,18 +818,18 @@ def upload_files():
                 if not filename:
                     filename = f"upload_{int(time.time())}.ddd"
 
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-
-                # Sprawdź czy katalog istnieje
-                if not os.path.exists(app.config['UPLOAD_FOLDER']):
-                    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+                file_path = os.path.join(batch_folder, filename)
 
-                file.save(file_path)
+                # Kopiuj strumień uploadu blokami po 1 MiB (file.save używa 16 KB)
+                with open(file_path, 'wb') as destination:
+                    shutil.copyfileobj(file.stream, destination, UPLOAD_COPY_BUFFER_SIZE)
+                    # Pozycja po kopiowaniu = liczba zapisanych bajtów (bez dodatkowych stat)
+                    saved_size = destination.tell()
 
                 # Sprawdź czy plik został zapisany
-                if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+                if saved_size > 0:
                     uploaded_files.append(file_path)
-                    app.logger.info(f"File saved successfully: {filename} ({os.path.getsize(file_path)} bytes)")
+                    app.logger.info("File saved successfully: %s (%s bytes)", filename, saved_size)
                 else:
                     upload_errors.append(f"Plik {filename} nie został zapisany lub jest pusty")
 
@@ -628,39 +839,51 @@ def upload_files():
                 upload_errors.append(error_msg)
 
         if not uploaded_files:
+            shutil.rmtree(batch_folder, ignore_errors=True)
             error_details = "; ".join(upload_errors) if upload_errors else "Nieznany błąd"
             app.logger.error(f"No files were saved successfully. Errors: {error_details}")
-            return jsonify({'error': f'Nie udało się zapisać żadnego pliku. Szczegóły: {error_details}'}), 500
+            return fast_jsonify({'error': f'Nie udało się zapisać żadnego pliku. Szczegóły: {error_details}'}), 500
 
         if upload_errors:
             app.logger.warning(f"Some files had errors: {upload_errors}")
 
         app.logger.info(f"Starting background processing of {len(uploaded_files)} files")
 
-        # Rozpocznij przetwarzanie w tle
-        Thread(target=process_files_background,
-               args=(uploaded_files, parsed_start, parsed_end)).start()
+        # Rozpocznij przetwarzanie w tle - job_id odróżnia status tej partii od poprzedniej
+        job_id = uuid.uuid4().hex
+        _job_pool.submit(process_files_background, uploaded_files, parsed_start, parsed_end, batch_folder, job_id)
 
         response_data = {
             'message': f'Rozpoczęto przetwarzanie {len(uploaded_files)} plików',
             'total_files': len(uploaded_files),
-            'upload_errors': upload_errors if upload_errors else None
+            'upload_errors': upload_errors if upload_errors else None,
+            'job_id': job_id,
+            'status_events': app.config.get('STATUS_EVENTS_ENABLED', False)
         }
 
         app.logger.info(f"=== UPLOAD REQUEST SUCCESS ===")
-        return jsonify(response_data)
+        return fast_jsonify(response_data)
 
     except Exception as e:
         error_msg = f"Unexpected error in upload: {str(e)}"
         app.logger.error(f"{error_msg}\n{traceback.format_exc()}")
-        return jsonify({'error': f'Błąd serwera: {error_msg}'}), 500
+        return fast_jsonify({'error': f'Błąd serwera: {error_msg}'}), 500
 
-@app.route('/status')
-def get_status():
-    """Pobierz status przetwarzania"""
-    global processing_status
-
-    status = processing_status.copy()
+def _status_etag(status: Dict[str, Any]) -> str:
+    """ETag statusu - zmienia się przy postępie przetwarzania i co STATUS_ETAG_TIME_BUCKET_SECONDS"""
+    # Przedział czasu od startu - w trakcie przetwarzania odświeża czas trwania i szacowany czas do końca
+    if status['active'] and status['start_time']:
+        elapsed = (datetime.now() - status['start_time']).total_seconds()
+        time_bucket = int(elapsed // STATUS_ETAG_TIME_BUCKET_SECONDS)
+    else:
+        time_bucket = None
+    return hashlib.sha1(repr((
+        status['start_time'], status['active'], status['processed_files'],
+        status['current_file'], len(status['errors']), status['output_file'], time_bucket
+    )).encode('utf-8')).hexdigest()
+
+def _add_status_timing(status: Dict[str, Any]) -> Dict[str, Any]:
+    """Uzupełnia kopię statusu o czas trwania i szacowany czas do końca"""
     if status['start_time']:
         elapsed = (datetime.now() - status['start_time']).total_seconds()
         status['elapsed_time'] = elapsed
@@ -669,8 +892,60 @@ def get_status():
             avg_time_per_file = elapsed / status['processed_files']
             remaining_files = status['total_files'] - status['processed_files']
             status['estimated_time_remaining'] = avg_time_per_file * remaining_files
+    return status
 
-    return jsonify(status)
+@app.route('/status')
+def get_status():
+    """Pobierz status przetwarzania"""
+    status = _status_snapshot()
+
+    # Niezmienione odpytania dostają 304 bez ciała
+    etag = _status_etag(status)
+    if etag in request.if_none_match:
+        return '', 304, {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+
+    response = fast_jsonify(_add_status_timing(status))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/events')
+def status_events():
+    """Strumień statusu (Server-Sent Events) - zdarzenie wysyłane tylko przy zmianie.
+
+    Strumień zajmuje wątek serwera do końca partii - tylko dla serwerów z wątkami
+    lub asynchronicznych (STATUS_EVENTS_ENABLED), domyślnie strona odpytuje /status.
+    """
+    if not app.config.get('STATUS_EVENTS_ENABLED', False):
+        return fast_jsonify({'error': 'Nie znaleziono zasobu'}), 404
+
+    # Partia zwrócona przez /upload - wcześniejsze statusy (poprzednia partia, bezczynność) są pomijane
+    job_id = request.args.get('job')
+
+    def generate():
+        last_etag = None
+        last_sent = time.monotonic()
+        while True:
+            status = _status_snapshot()
+            current_job = job_id is None or status['job_id'] == job_id
+            etag = _status_etag(status)
+            if current_job and etag != last_etag:
+                last_etag = etag
+                last_sent = time.monotonic()
+                yield f"data: {_json_dumps(_add_status_timing(status))}\n\n"
+            elif time.monotonic() - last_sent >= STATUS_EVENTS_KEEPALIVE_SECONDS:
+                last_sent = time.monotonic()
+                yield ": keepalive\n\n"
+
+            # Po zakończeniu przetwarzania ostatni status został już wysłany
+            if current_job and not status['active']:
+                return
+
+            with _status_changed:
+                _status_changed.wait(STATUS_EVENTS_POLL_SECONDS)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/download/<filename>')
 def download_file(filename):
@@ -683,180 +958,204 @@ def download_file(filename):
 @app.route('/debug')
 def debug_info():
     """Endpoint diagnostyczny"""
-    return jsonify({
+    status = _status_snapshot()
+    return fast_jsonify({
         'status': 'OK',
         'upload_folder': app.config['UPLOAD_FOLDER'],
         'upload_folder_exists': os.path.exists(app.config['UPLOAD_FOLDER']),
         'upload_folder_writable': os.access(app.config['UPLOAD_FOLDER'], os.W_OK) if os.path.exists(app.config['UPLOAD_FOLDER']) else False,
         'output_folder': app.config['OUTPUT_FOLDER'],
         'max_content_length': app.config['MAX_CONTENT_LENGTH'],
-        'processing_active': processing_status['active'],
+        'processing_active': status['active'],
         'server_time': datetime.now().isoformat(),
         'supported_formats': ['.ddd', '.DDD', 'Smart Tacho V2'],
         'python_version': f"{os.sys.version_info.major}.{os.sys.version_info.minor}.{os.sys.version_info.micro}",
         'flask_debug': app.debug,
-        'recent_processing_status': processing_status
+        'recent_processing_status': status
     })
 
-def process_files_background(file_paths: List[str], start_date=None, end_date=None):
+def process_files_background(file_paths: List[str], start_date=None, end_date=None, batch_folder=None, job_id=None):
     """Przetwarzaj pliki w tle - NAPRAWIONA WERSJA"""
     global processing_status
 
-    processing_status = {
-        'active': True,
-        'total_files': len(file_paths),
-        'processed_files': 0,
-        'current_file': '',
-        'start_time': datetime.now(),
-        'errors': [],
-        'output_file': None
-    }
+    with _status_lock:
+        processing_status = {
+            'active': True,
+            'total_files': len(file_paths),
+            'processed_files': 0,
+            'current_file': '',
+            'start_time': datetime.now(),
+            'errors': [],
+            'output_file': None,
+            'job_id': job_id
+        }
+        _status_changed.notify_all()
 
     workshifts = []
+    output_folder = app.config['OUTPUT_FOLDER']
 
     try:
         app.logger.info(f"Starting background processing - files: {len(file_paths)}, start_date: {start_date}, end_date: {end_date}")
 
-        for file_path in file_paths:
-            processing_status['current_file'] = os.path.basename(file_path)
-            app.logger.info(f"Processing file: {processing_status['current_file']}")
+        # Granice filtra jako daty (bez czasu) - liczone raz dla całej partii
+        start_d = start_date.date() if start_date else date.min
+        end_d = end_date.date() if end_date else date.max
+        filter_range = f"[{start_d if start_date else '-'}, {end_d if end_date else '-'}]"
+
+        # Data workshiftu pochodzi wyłącznie z nazwy pliku (bez daty w nazwie - dzisiejsza),
+        # więc pliki spoza zakresu można pominąć bez parsowania zawartości
+        if start_date or end_date:
+            today = date.today()
+            files_to_parse = []
+            for file_path in file_paths:
+                filename = os.path.basename(file_path)
+                filename_date = _date_from_filename(filename)
+                file_date = filename_date.date() if filename_date else today
+                if not (start_d <= file_date <= end_d):
+                    app.logger.info("File %s skipped before parsing (date: %s)", filename, file_date)
+                    continue
+                files_to_parse.append(file_path)
+
+            skipped = len(file_paths) - len(files_to_parse)
+            if skipped:
+                with _status_lock:
+                    processing_status['processed_files'] += skipped
+                    _status_changed.notify_all()
+        else:
+            files_to_parse = list(file_paths)
+
+        executor, results = _start_parse_jobs(files_to_parse)
+        with executor:
+            # Wyniki odbierane w kolejności ukończenia, raport zachowuje kolejność plików
+            included = [None] * len(files_to_parse)
+            completed = [False] * len(files_to_parse)
+            # Najstarszy nieukończony plik - pula i parsowanie szeregowe biorą pliki w kolejności zlecenia,
+            # więc to on jest właśnie przetwarzany (current_file)
+            pending_index = 0
+            if files_to_parse:
+                with _status_lock:
+                    processing_status['current_file'] = os.path.basename(files_to_parse[0])
+                    _status_changed.notify_all()
+
+            for index, future in results:
+                file_path = files_to_parse[index]
+                current_file = os.path.basename(file_path)
+                app.logger.info("Processing file: %s", current_file)
 
-            try:
-                # Parsuj plik .DDD
-                workshift = ddd_parser.parse_ddd_file(file_path)
+                try:
+                    # Odbierz wynik parsowania pliku .DDD z procesu roboczego
+                    workshift, worker_log_records = future.result()
+                    for record in worker_log_records:
+                        logging.getLogger(record.name).handle(record)
 
-                # NAPRAWIONE FILTROWANIE DAT - porównanie tylko dat bez czasu
-                should_include = True
-                filter_reason = None
+                    # Filtrowanie dat - porównanie tylko dat bez czasu (brak filtra = date.min/date.max)
+                    workshift_date = workshift.date.date()
+                    app.logger.info("Workshift date: %s, start_date: %s, end_date: %s", workshift.date, start_date, end_date)
 
-                app.logger.info(f"Workshift date: {workshift.date}, start_date: {start_date}, end_date: {end_date}")
+                    if start_d <= workshift_date <= end_d:
+                        included[index] = workshift
+                        app.logger.info("File %s included in processing (date: %s)", current_file, workshift_date)
+                    else:
+                        app.logger.info("File %s filtered out: date %s not in range %s", current_file, workshift_date, filter_range)
 
-                # Filtruj według dat tylko jeśli są ustawione
-                if start_date and end_date:
-                    # Oba filtry ustawione - sprawdź zakres (porównuj tylko daty)
-                    workshift_date = workshift.date.date()
-                    start_filter_date = start_date.date()
-                    end_filter_date = end_date.date()
-
-                    if workshift_date < start_filter_date or workshift_date > end_filter_date:
-                        should_include = False
-                        filter_reason = f"date {workshift_date} not in range [{start_filter_date}, {end_filter_date}]"
-                elif start_date:
-                    # Tylko data początkowa
-                    if workshift.date.date() < start_date.date():
-                        should_include = False
-                        filter_reason = f"date {workshift.date.date()} before {start_date.date()}"
-                elif end_date:
-                    # Tylko data końcowa
-                    if workshift.date.date() > end_date.date():
-                        should_include = False
-                        filter_reason = f"date {workshift.date.date()} after {end_date.date()}"
-
-                if should_include:
-                    workshifts.append(workshift)
-                    app.logger.info(f"File {processing_status['current_file']} included in processing (date: {workshift.date.date()})")
-                else:
-                    app.logger.info(f"File {processing_status['current_file']} filtered out: {filter_reason}")
+                except Exception as e:
+                    error_msg = f"Błąd przetwarzania {current_file}: {str(e)}"
+                    with _status_lock:
+                        processing_status['errors'].append(error_msg)
+                    app.logger.error(f"{error_msg}\n{traceback.format_exc()}")
 
-            except Exception as e:
-                error_msg = f"Błąd przetwarzania {os.path.basename(file_path)}: {str(e)}"
-                processing_status['errors'].append(error_msg)
-                app.logger.error(f"{error_msg}\n{traceback.format_exc()}")
+                    # DODAJ FALLBACK - stwórz podstawowy workshift nawet przy błędzie parsowania
+                    try:
+                        app.logger.info("Attempting fallback for %s", current_file)
+                        fallback_workshift = ddd_parser._create_fallback_workshift(file_path)
+
+                        # Sprawdź filtr dat dla fallback
+                        fallback_date = fallback_workshift.date.date()
+                        if start_d <= fallback_date <= end_d:
+                            included[index] = fallback_workshift
+                            app.logger.info("Added fallback workshift for %s (date: %s)", current_file, fallback_date)
+                        else:
+                            app.logger.info("Fallback workshift for %s also filtered out by date", current_file)
 
-                # DODAJ FALLBACK - stwórz podstawowy workshift nawet przy błędzie parsowania
-                try:
-                    app.logger.info(f"Attempting fallback for {processing_status['current_file']}")
-                    fallback_workshift = ddd_parser._create_fallback_workshift(file_path)
-
-                    # Sprawdź filtr dat dla fallback
-                    should_include_fallback = True
-                    if start_date and end_date:
-                        if fallback_workshift.date.date() < start_date.date() or fallback_workshift.date.date() > end_date.date():
-                            should_include_fallback = False
-                    elif start_date:
-                        if fallback_workshift.date.date() < start_date.date():
-                            should_include_fallback = False
-                    elif end_date:
-                        if fallback_workshift.date.date() > end_date.date():
-                            should_include_fallback = False
-
-                    if should_include_fallback:
-                        workshifts.append(fallback_workshift)
-                        app.logger.info(f"Added fallback workshift for {processing_status['current_file']} (date: {fallback_workshift.date.date()})")
-                    else:
-                        app.logger.info(f"Fallback workshift for {processing_status['current_file']} also filtered out by date")
+                    except Exception as fallback_error:
+                        app.logger.error(f"Fallback also failed for {current_file}: {fallback_error}")
+
+                completed[index] = True
+                while pending_index < len(files_to_parse) and completed[pending_index]:
+                    pending_index += 1
 
-                except Exception as fallback_error:
-                    app.logger.error(f"Fallback also failed for {processing_status['current_file']}: {fallback_error}")
+                with _status_lock:
+                    processing_status['processed_files'] += 1
+                    if pending_index < len(files_to_parse):
+                        processing_status['current_file'] = os.path.basename(files_to_parse[pending_index])
+                    _status_changed.notify_all()
 
-            processing_status['processed_files'] += 1
-            time.sleep(0.1)
+        workshifts = [workshift for workshift in included if workshift is not None]
 
         # Generuj raport Excel
         if workshifts:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             output_filename = f'workshifts_{timestamp}.xlsx'
-            output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+            output_path = os.path.join(output_folder, output_filename)
 
             workshift_generator.generate_excel_report(workshifts, output_path)
-            processing_status['output_file'] = output_filename
+            with _status_lock:
+                processing_status['output_file'] = output_filename
             app.logger.info(f"Generated Excel report: {output_filename} with {len(workshifts)} workshifts")
         else:
+            # Bez workshiftów nie ma czego zapisywać - output_file zostaje None,
+            # a strona pokazuje komunikat z listy błędów zamiast pustego raportu
             error_msg = "Brak workshiftów do wygenerowania"
             if start_date or end_date:
                 error_msg += f" (po filtrowaniu dat: {start_date.date() if start_date else 'brak'} - {end_date.date() if end_date else 'brak'})"
-            processing_status['errors'].append(error_msg)
+            with _status_lock:
+                processing_status['errors'].append(error_msg)
             app.logger.warning(error_msg)
 
-            # Jeśli nie ma workshiftów, stwórz pusty raport
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            output_filename = f'empty_report_{timestamp}.xlsx'
-            output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-
-            # Stwórz pusty workshift dla pustego raportu
-            empty_workshift = WorkShift(
-                driver_name="Brak danych po filtrowaniu",
-                vehicle_id="N/A",
-                date=datetime.now(),
-                activities=[]
-            )
-
-            workshift_generator.generate_excel_report([empty_workshift], output_path)
-            processing_status['output_file'] = output_filename
-            app.logger.info(f"Generated empty Excel report: {output_filename}")
-
     except Exception as e:
         error_msg = f"Błąd krytyczny: {str(e)}"
-        processing_status['errors'].append(error_msg)
+        with _status_lock:
+            processing_status['errors'].append(error_msg)
         app.logger.error(f"{error_msg}\n{traceback.format_exc()}")
 
     finally:
-        processing_status['active'] = False
+        with _status_lock:
+            processing_status['active'] = False
+            _status_changed.notify_all()
 
         # Wyczyść pliki tymczasowe
-        for file_path in file_paths:
-            try:
-                if os.path.exists(file_path):
+        if batch_folder:
+            shutil.rmtree(batch_folder, ignore_errors=True)
+            app.logger.info(f"Cleaned up temporary batch folder: {batch_folder}")
+        else:
+            for file_path in file_paths:
+                try:
                     os.remove(file_path)
-                    app.logger.info(f"Cleaned up temporary file: {file_path}")
-            except Exception as e:
-                app.logger.warning(f"Could not remove temporary file {file_path}: {e}")
+                    app.logger.info("Cleaned up temporary file: %s", file_path)
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    app.logger.warning(f"Could not remove temporary file {file_path}: {e}")
 
 # Cleanup functions
 def cleanup_old_files():
     """Czyści stare pliki z katalogów upload i output"""
     try:
         cutoff_time = datetime.now() - timedelta(hours=app.config.get('FILE_CLEANUP_HOURS', 24))
+        cutoff_ts = cutoff_time.timestamp()
 
         for folder in [app.config['UPLOAD_FOLDER'], app.config['OUTPUT_FOLDER']]:
             if os.path.exists(folder):
-                for filename in os.listdir(folder):
-                    filepath = os.path.join(folder, filename)
-                    if os.path.isfile(filepath):
-                        file_time = datetime.fromtimestamp(os.path.getmtime(filepath))
-                        if file_time < cutoff_time:
-                            os.remove(filepath)
-                            app.logger.info(f"Usunięto stary plik: {filepath}")
+                # scandir zwraca typ pliku z wpisu katalogu - bez osobnych wywołań stat
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < cutoff_ts:
+                            os.remove(entry.path)
+                            app.logger.info(f"Usunięto stary plik: {entry.path}")
+                        elif entry.is_dir(follow_symlinks=False) and entry.stat().st_mtime < cutoff_ts:
+                            # Pozostałości partii przerwanych przed sprzątnięciem
+                            shutil.rmtree(entry.path, ignore_errors=True)
+                            app.logger.info(f"Usunięto stary katalog: {entry.path}")
     except Exception as e:
         app.logger.error(f"Błąd podczas czyszczenia plików: {str(e)}")
 
@@ -18,6 +18,16 @@ class Config:
     PROCESSING_TIMEOUT = int(os.environ.get('PROCESSING_TIMEOUT', 3600))  # 1 hour
     FILE_CLEANUP_HOURS = int(os.environ.get('FILE_CLEANUP_HOURS', 24))  # 24 hours
 
+    # Przetwarzanie równoległe
+    PARALLEL_MIN_FILES = int(os.environ.get('PARALLEL_MIN_FILES', 4))  # mniejsze partie parsowane szeregowo
+    MAX_WORKERS = int(os.environ.get('MAX_WORKERS', 0))  # 0 = liczba rdzeni CPU
+    MAX_JOB_WORKERS = int(os.environ.get('MAX_JOB_WORKERS', 1))  # równoległe partie (status jest wspólny)
+
+    # Status przez Server-Sent Events (/events) - każdy otwarty strumień zajmuje wątek do końca partii.
+    # Tylko dla serwerów z wątkami lub asynchronicznych (serwer deweloperski, gunicorn -k gthread/gevent);
+    # przy synchronicznych workerach gunicorna zostaje domyślne odpytywanie /status.
+    STATUS_EVENTS_ENABLED = os.environ.get('STATUS_EVENTS_ENABLED', 'false').lower() in ['true', 'on', '1']
+
     # Database (dla przyszłych rozszerzeń)
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///ddd_parser.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
@@ -10,6 +10,110 @@ import json
 import os
 import re
 import logging
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Prekompilowane układy rekordów binarnych
+# Nagłówek standardowy od offsetu 4: wersja (u16), czas utworzenia (u32), długość danych (u32)
+_HEADER_STRUCT = struct.Struct('>HII')
+# Liczniki pojazdu od offsetu 35: licznik początkowy (u32), końcowy (u32), limit prędkości (u16)
+_VEHICLE_COUNTERS_STRUCT = struct.Struct('>IIH')
+# Lokalizacja GPS: szerokość i długość (i32, mikrostopnie)
+_LOCATION_STRUCT = struct.Struct('>ii')
+_U16_STRUCT = struct.Struct('>H')
+_U32_STRUCT = struct.Struct('>I')
+_U32_LE_STRUCT = struct.Struct('<I')
+
+# Tagi sekcji pliku standardowego: 0x05 0x01..0x05 (lookahead - wystąpienia mogą na siebie zachodzić)
+_SECTION_TAG_RE = re.compile(rb'\x05(?=[\x01-\x05])')
+_SECTION_TAG_COUNT = 5
+
+# Dekodowanie BCD bajtu jednym indeksowaniem: _BCD_LUT[b] == (b >> 4) * 10 + (b & 0x0F)
+_BCD_LUT = bytes(((b >> 4) * 10) + (b & 0x0F) for b in range(256))
+# Maksymalny dzień miesiąca (indeks = miesiąc; luty 29, rok przestępny sprawdzany osobno)
+_DAYS_IN_MONTH = (0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+# Znaczniki Smart Tacho V2 w początku pliku - jedno wyszukiwanie zamiast pętli po znacznikach
+_V2_MARKERS = (
+    b'smart_tacho_v2',
+    b'vdo_smart',
+    b'stv2',
+    b'smart tacho',
+    b'tacho smart',
+    b'smarttacho',
+    b'continental vdo',
+    b'kienzle',
+    b'stoneridge se5000'
+)
+_V2_MARKER_RE = re.compile(b'|'.join(map(re.escape, _V2_MARKERS)), re.IGNORECASE)
+_V2_MARKER_WINDOW = 1000
+
+# Limity liczby rekordów V2 - skanowanie kończy się po ich osiągnięciu
+_V2_MAX_ACTIVITIES = 50
+_V2_MAX_EVENTS = 30
+_V2_MAX_SPEEDS = 100
+
+# Bajty typu aktywności V2 (0x10-0x50) jako tablica translate: 1 dla typu, 0 dla reszty
+_V2_ACTIVITY_BYTE_FLAGS = bytes(1 if b in (0x10, 0x20, 0x30, 0x40, 0x50) else 0 for b in range(256))
+
+# Tagi bloków tekstowych V2 (aktywności, zdarzenia, prędkości) - jedna alternacja dla wszystkich.
+# Wystąpienia różnych tagów nie mogą na siebie zachodzić, więc finditer zwraca każde wystąpienie
+_V2_RECORD_TAG_RE = re.compile(rb'ACT:|ACTIVITY:|ACTV:|A:|EVT:|EVENT:|E:|SPD:|SPEED:|VEL:')
+
+# Układy binarnego bloku aktywności V2: (pozycja typu, pozycja czasu, pozycja czasu trwania)
+_V2_BINARY_ACTIVITY_LAYOUTS = ((0, 1, 5), (4, 0, 8), (8, 0, 12))
+
+# Wzorce metadanych Smart Tacho V2 - kompilowane raz; warianty etykiet połączone w jedną alternację
+_V2_SERIAL_RE = re.compile(rb'(?:SN|SERIAL|S/N|SER):([A-Z0-9]{8,16})')
+_V2_FIRMWARE_RE = re.compile(rb'(?:FW:|FIRMWARE:|VER:|V)([0-9]{1,2}\.[0-9]{1,2}\.[0-9]{1,2})')
+
+
+def _utf8_letters_pattern(letters: str) -> bytes:
+    """Alternacja bajtowa liter UTF-8 (2 bajty) pogrupowana po bajcie wiodącym, np. \\xc4[\\x84\\x86]"""
+    trails_by_lead = {}
+    for letter in sorted(letters):
+        lead, trail = letter.encode('utf-8')
+        trails_by_lead.setdefault(lead, bytearray()).append(trail)
+    return b'|'.join(re.escape(bytes([lead])) + b'[' + re.escape(bytes(trails)) + b']'
+                     for lead, trails in sorted(trails_by_lead.items()))
+
+
+# Imię i nazwisko mogą zawierać polskie litery (UTF-8); małe też, bo upper() na bytes zmienia tylko ASCII
+_POLISH_LETTERS_PATTERN = _utf8_letters_pattern('ĄĆĘŁŃÓŚŹŻąćęłńóśźż')
+# Dane kierowcy - wyszukiwane w oknie zamienionym na wielkie litery (bez re.IGNORECASE)
+_V2_CARD_NUMBER_RE = re.compile(rb'(?:CARD|CARD_NO|CARDNO):([A-Z0-9]{16})|CARD_NUM:([A-Z0-9]{8,20})')
+_V2_DRIVER_NAME_RE = re.compile(rb'(?:NAME|DRIVER|SURNAME|DRVR):((?:[A-Z\s]|' + _POLISH_LETTERS_PATTERN + rb'){2,40})')
+_V2_LICENSE_NUMBER_RE = re.compile(rb'(?:LIC|LICENSE|LICENCE|DL):([A-Z0-9]{5,20})')
+_V2_DRIVER_FIELD_PATTERNS = (
+    ('card_number', _V2_CARD_NUMBER_RE),
+    ('driver_name', _V2_DRIVER_NAME_RE),
+    ('license_number', _V2_LICENSE_NUMBER_RE),
+)
+_V2_VIN_RE = re.compile(rb'(?:VIN|VEHICLE_ID|VIN_NO|WVIN):([A-HJ-NPR-Z0-9]{17})')
+_V2_REGISTRATION_RE = re.compile(rb'(?:REG|PLATE|LICENSE_PLATE|LP):([A-Z0-9\s\-]{2,15})')
+_V2_ODOMETER_RE = re.compile(rb'(?:ODO|ODOMETER|MILEAGE|KM):(\d{6,8})')
+# Daty zapisane tekstowo: (wzorzec, format strptime) w kolejności priorytetu
+_V2_TEXT_DATE_PATTERNS = (
+    (re.compile(rb'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})'), '%Y-%m-%d %H:%M:%S'),
+    (re.compile(rb'(\d{2}/\d{2}/\d{4} \d{2}:\d{2})'), '%d/%m/%Y %H:%M'),
+    (re.compile(rb'(\d{8} \d{6})'), '%Y%m%d %H%M%S'),  # YYYYMMDD HHMMSS
+)
+# Okna (w bajtach od początku pliku), w których szukane są metadane V2
+_V2_HEADER_WINDOW = 800
+_V2_DRIVER_WINDOW = 3000
+_V2_VEHICLE_WINDOW = 2000
+_V2_TEXT_DATE_WINDOW = 1000
+
+
+@lru_cache(maxsize=4096)
+def _format_v2_timestamp(timestamp: int) -> str:
+    """Formatuje sekundy epoki jako czas lokalny; V2 powtarza te same znaczniki czasu w wielu blokach"""
+    return datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
 
 class TachoParser:
     """Parser plików .DDD tachografów cyfrowych z obsługą Smart Tacho V2"""
@@ -22,6 +126,8 @@ class TachoParser:
         0x03: 'driving',    # Jazda
         0xFF: 'unknown'     # Nieznane
     }
+    # To samo jako krotka indeksowana bajtem (bez haszowania w pętli rekordów)
+    ACTIVITY_TYPES_BY_BYTE = tuple(map(ACTIVITY_TYPES.get, range(256), ('unknown',) * 256))
 
     # Smart Tacho V2 activity types
     SMART_V2_ACTIVITY_TYPES = {
@@ -32,10 +138,41 @@ class TachoParser:
         0x50: 'rest',
         0xFF: 'unknown'
     }
+    SMART_V2_ACTIVITY_TYPES_BY_BYTE = tuple(map(SMART_V2_ACTIVITY_TYPES.get, range(256), ('unknown',) * 256))
+
+    # Smart Tacho V2 event types
+    SMART_V2_EVENT_TYPES = {
+        0x01: 'speed_violation',
+        0x02: 'driving_time_violation',
+        0x03: 'card_inserted',
+        0x04: 'card_removed',
+        0x05: 'power_supply_interruption',
+        0x06: 'motion_sensor_fault',
+        0x07: 'calibration_error',
+        0x08: 'data_corruption',
+        0xFF: 'unknown'
+    }
+    SMART_V2_EVENT_TYPES_BY_BYTE = tuple(map(SMART_V2_EVENT_TYPES.get, range(256), ('unknown',) * 256))
+
+    # Opisy zdarzeń Smart Tacho V2
+    SMART_V2_EVENT_DESCRIPTIONS = {
+        0x01: 'Przekroczenie prędkości',
+        0x02: 'Przekroczenie czasu jazdy',
+        0x03: 'Włożenie karty kierowcy',
+        0x04: 'Wyjęcie karty kierowcy',
+        0x05: 'Przerwa w zasilaniu',
+        0x06: 'Błąd sensora ruchu',
+        0x07: 'Błąd kalibracji',
+        0x08: 'Uszkodzenie danych'
+    }
+    SMART_V2_EVENT_DESCRIPTIONS_BY_BYTE = tuple(
+        map(SMART_V2_EVENT_DESCRIPTIONS.get, range(256), ('Nieznane zdarzenie',) * 256)
+    )
 
     def __init__(self):
         self.raw_data = None
         self.parsed_data = {}
+        self._section_offsets = {}
         self.logger = logging.getLogger(__name__)
 
     def parse(self, raw_data: bytes) -> Dict[str, Any]:
@@ -50,7 +187,8 @@ class TachoParser:
             # Użyj dedykowanego parsera dla Smart Tacho V2
             self.parsed_data = self.parse_smart_tacho_v2(raw_data)
         else:
-            # Standardowy parser
+            # Standardowy parser - offsety wszystkich sekcji w jednym przebiegu
+            self._section_offsets = self._index_sections()
             self.parsed_data = {
                 'format': tacho_version,
                 'header': self._parse_header(),
@@ -66,28 +204,12 @@ class TachoParser:
     def detect_tacho_version(self, raw_data: bytes) -> str:
         """Wykrywa wersję tachografu na podstawie danych"""
         try:
-            # Konwertuj na lowercase dla łatwiejszego wyszukiwania
-            data_str = str(raw_data[:2000]).lower()
-
-            # Smart Tacho V2 - charakterystyczne znaczniki
-            smart_v2_markers = [
-                b'smart_tacho_v2',
-                b'vdo_smart',
-                b'stv2',
-                b'smart tacho',
-                b'tacho smart',
-                b'smarttacho',
-                b'continental vdo',
-                b'kienzle',
-                b'stoneridge se5000'
-            ]
-
-            for marker in smart_v2_markers:
-                if marker in raw_data[:1000].lower():
-                    return 'Smart Tacho V2'
+            # Smart Tacho V2 - charakterystyczne znaczniki (bez względu na wielkość liter)
+            if _V2_MARKER_RE.search(raw_data, 0, _V2_MARKER_WINDOW):
+                return 'Smart Tacho V2'
 
             # Sprawdź wzorce w danych
-            if b'VDO' in raw_data[:500] and b'Smart' in raw_data[:500]:
+            if raw_data.find(b'VDO', 0, 500) != -1 and raw_data.find(b'Smart', 0, 500) != -1:
                 return 'Smart Tacho V2'
 
             # Sprawdź strukturę pliku - Smart Tacho V2 ma inne nagłówki
@@ -104,11 +226,11 @@ class TachoParser:
                 return 'Standard EU'
 
             # Inne popularne formaty
-            if b'EFAS' in raw_data[:100]:
+            if raw_data.find(b'EFAS', 0, 100) != -1:
                 return 'EFAS'
-            elif b'Stoneridge' in raw_data[:200]:
+            elif raw_data.find(b'Stoneridge', 0, 200) != -1:
                 return 'Stoneridge'
-            elif b'Siemens VDO' in raw_data[:200]:
+            elif raw_data.find(b'Siemens VDO', 0, 200) != -1:
                 return 'Siemens VDO'
 
             return 'Unknown'
@@ -119,14 +241,16 @@ class TachoParser:
     def parse_smart_tacho_v2(self, raw_data: bytes) -> Dict[str, Any]:
         """Parser specjalnie dla Smart Tacho V2"""
         try:
+            # Pozycje tagów aktywności, zdarzeń i prędkości z jednego przebiegu po pliku
+            tag_positions = self._find_v2_tag_positions(raw_data)
             parsed_data = {
                 'format': 'Smart Tacho V2',
                 'header': self._parse_v2_header(raw_data),
                 'driver_data': self._parse_v2_driver_data(raw_data),
                 'vehicle_data': self._parse_v2_vehicle_data(raw_data),
-                'activities': self._parse_v2_activities(raw_data),
-                'events': self._parse_v2_events(raw_data),
-                'speeds': self._parse_v2_speeds(raw_data)
+                'activities': self._parse_v2_activities(raw_data, tag_positions),
+                'events': self._parse_v2_events(raw_data, tag_positions),
+                'speeds': self._parse_v2_speeds(raw_data, tag_positions)
             }
             return parsed_data
         except Exception as e:
@@ -141,56 +265,36 @@ class TachoParser:
             # Szukaj znaczników V2
             markers_found = []
 
-            if b'VDO' in raw_data[:200]:
-                vdo_pos = raw_data.find(b'VDO')
+            vdo_pos = raw_data.find(b'VDO', 0, 200)
+            if vdo_pos != -1:
                 header['device_manufacturer'] = 'VDO'
                 markers_found.append('VDO')
 
                 # Data utworzenia może być w różnych offsetach
                 for offset in [20, 24, 28, 32]:
                     if vdo_pos + offset + 4 < len(raw_data):
-                        timestamp_bytes = raw_data[vdo_pos+offset:vdo_pos+offset+4]
-                        parsed_time = self._parse_timestamp(timestamp_bytes)
+                        parsed_time = self._parse_timestamp(raw_data, vdo_pos + offset)
                         if parsed_time != "N/A":
                             header['creation_time'] = parsed_time
                             break
 
-            if b'SMART' in raw_data[:500]:
-                smart_pos = raw_data.find(b'SMART')
+            if raw_data.find(b'SMART', 0, 500) != -1:
                 header['device_type'] = 'Smart Tacho'
                 markers_found.append('SMART')
 
-            if b'Continental' in raw_data[:300]:
+            if raw_data.find(b'Continental', 0, 300) != -1:
                 header['manufacturer'] = 'Continental'
                 markers_found.append('Continental')
 
             # Numer seryjny urządzenia - różne wzorce
-            serial_patterns = [
-                rb'SN:([A-Z0-9]{8,16})',
-                rb'SERIAL:([A-Z0-9]{8,16})',
-                rb'S/N:([A-Z0-9]{8,16})',
-                rb'SER:([A-Z0-9]{8,16})'
-            ]
-
-            for pattern in serial_patterns:
-                serial_match = re.search(pattern, raw_data[:800])
-                if serial_match:
-                    header['serial_number'] = serial_match.group(1).decode('ascii', errors='ignore')
-                    break
+            serial_match = _V2_SERIAL_RE.search(raw_data, 0, _V2_HEADER_WINDOW)
+            if serial_match:
+                header['serial_number'] = serial_match.group(1).decode('ascii', errors='ignore')
 
             # Wersja firmware - różne wzorce
-            fw_patterns = [
-                rb'FW:([0-9]{1,2}\.[0-9]{1,2}\.[0-9]{1,2})',
-                rb'FIRMWARE:([0-9]{1,2}\.[0-9]{1,2}\.[0-9]{1,2})',
-                rb'VER:([0-9]{1,2}\.[0-9]{1,2}\.[0-9]{1,2})',
-                rb'V([0-9]{1,2}\.[0-9]{1,2}\.[0-9]{1,2})'
-            ]
-
-            for pattern in fw_patterns:
-                fw_match = re.search(pattern, raw_data[:800])
-                if fw_match:
-                    header['firmware_version'] = fw_match.group(1).decode('ascii', errors='ignore')
-                    break
+            fw_match = _V2_FIRMWARE_RE.search(raw_data, 0, _V2_HEADER_WINDOW)
+            if fw_match:
+                header['firmware_version'] = fw_match.group(1).decode('ascii', errors='ignore')
 
             # Rozmiar pliku i podstawowe info
             header['file_size'] = len(raw_data)
@@ -210,34 +314,15 @@ class TachoParser:
         try:
             driver_data = {}
 
-            # Wzorce dla Smart Tacho V2 - bardziej elastyczne
-            patterns = {
-                'card_number': [
-                    rb'CARD:([A-Z0-9]{16})',
-                    rb'CARD_NO:([A-Z0-9]{16})',
-                    rb'CARDNO:([A-Z0-9]{16})',
-                    rb'CARD_NUM:([A-Z0-9]{8,20})'
-                ],
-                'driver_name': [
-                    rb'NAME:([A-ZĄĆĘŁŃÓŚŹŻ\s]{2,40})',
-                    rb'DRIVER:([A-ZĄĆĘŁŃÓŚŹŻ\s]{2,40})',
-                    rb'SURNAME:([A-ZĄĆĘŁŃÓŚŹŻ\s]{2,40})',
-                    rb'DRVR:([A-ZĄĆĘŁŃÓŚŹŻ\s]{2,40})'
-                ],
-                'license_number': [
-                    rb'LIC:([A-Z0-9]{5,20})',
-                    rb'LICENSE:([A-Z0-9]{5,20})',
-                    rb'LICENCE:([A-Z0-9]{5,20})',
-                    rb'DL:([A-Z0-9]{5,20})'
-                ]
-            }
-
-            for key, pattern_list in patterns.items():
-                for pattern in pattern_list:
-                    match = re.search(pattern, raw_data[:3000], re.IGNORECASE)
-                    if match:
-                        driver_data[key] = match.group(1).decode('ascii', errors='ignore').strip()
-                        break
+            # Wzorce dla Smart Tacho V2 - bardziej elastyczne. Okno zamieniane raz na wielkie
+            # litery zamiast IGNORECASE w każdym wzorcu; upper() nie zmienia długości, więc
+            # pozycje grup wskazują te same bajty w oryginale (z oryginalną wielkością liter)
+            window = raw_data[:_V2_DRIVER_WINDOW].upper()
+            for key, pattern in _V2_DRIVER_FIELD_PATTERNS:
+                match = pattern.search(window)
+                if match:
+                    start, end = match.span(match.lastindex)
+                    driver_data[key] = raw_data[start:end].decode('utf-8', errors='ignore').strip()
 
             # Dodatkowe parsowanie - szukaj bloków danych kierowcy
             driver_block = self._find_v2_driver_block(raw_data)
@@ -255,46 +340,19 @@ class TachoParser:
             vehicle_data = {}
 
             # VIN - Vehicle Identification Number (bardziej elastyczne wzorce)
-            vin_patterns = [
-                rb'VIN:([A-HJ-NPR-Z0-9]{17})',
-                rb'VEHICLE_ID:([A-HJ-NPR-Z0-9]{17})',
-                rb'VIN_NO:([A-HJ-NPR-Z0-9]{17})',
-                rb'WVIN:([A-HJ-NPR-Z0-9]{17})'
-            ]
-
-            for pattern in vin_patterns:
-                vin_match = re.search(pattern, raw_data[:2000])
-                if vin_match:
-                    vehicle_data['vin'] = vin_match.group(1).decode('ascii')
-                    break
+            vin_match = _V2_VIN_RE.search(raw_data, 0, _V2_VEHICLE_WINDOW)
+            if vin_match:
+                vehicle_data['vin'] = vin_match.group(1).decode('ascii')
 
             # Numer rejestracyjny
-            reg_patterns = [
-                rb'REG:([A-Z0-9\s\-]{2,15})',
-                rb'PLATE:([A-Z0-9\s\-]{2,15})',
-                rb'LICENSE_PLATE:([A-Z0-9\s\-]{2,15})',
-                rb'LP:([A-Z0-9\s\-]{2,15})'
-            ]
-
-            for pattern in reg_patterns:
-                reg_match = re.search(pattern, raw_data[:2000])
-                if reg_match:
-                    vehicle_data['registration'] = reg_match.group(1).decode('ascii').strip()
-                    break
+            reg_match = _V2_REGISTRATION_RE.search(raw_data, 0, _V2_VEHICLE_WINDOW)
+            if reg_match:
+                vehicle_data['registration'] = reg_match.group(1).decode('ascii').strip()
 
             # Odometer - różne formaty
-            odo_patterns = [
-                rb'ODO:(\d{6,8})',
-                rb'ODOMETER:(\d{6,8})',
-                rb'MILEAGE:(\d{6,8})',
-                rb'KM:(\d{6,8})'
-            ]
-
-            for pattern in odo_patterns:
-                odo_match = re.search(pattern, raw_data[:2000])
-                if odo_match:
-                    vehicle_data['odometer'] = int(odo_match.group(1))
-                    break
+            odo_match = _V2_ODOMETER_RE.search(raw_data, 0, _V2_VEHICLE_WINDOW)
+            if odo_match:
+                vehicle_data['odometer'] = int(odo_match.group(1))
 
             # Dodatkowe dane pojazdu z bloków binarnych
             vehicle_block = self._find_v2_vehicle_block(raw_data)
@@ -306,15 +364,21 @@ class TachoParser:
             self.logger.error(f"Error parsing V2 vehicle data: {e}")
             return {'error': f'Błąd parsowania danych pojazdu V2: {str(e)}'}
 
-    def _parse_v2_activities(self, raw_data: bytes) -> List[Dict[str, Any]]:
+    def _parse_v2_activities(self, raw_data: bytes,
+                             tag_positions: Optional[Dict[bytes, List[int]]] = None) -> List[Dict[str, Any]]:
         """Parsuje aktywności Smart Tacho V2"""
         activities = []
         try:
             # Smart Tacho V2 może używać różnych formatów bloków aktywności
             activity_patterns = [b'ACT:', b'ACTIVITY:', b'ACTV:', b'A:']
+            if tag_positions is None:
+                tag_positions = self._find_v2_tag_positions(raw_data)
 
             for pattern in activity_patterns:
-                activities_from_pattern = self._parse_activities_by_pattern(raw_data, pattern)
+                positions = tag_positions.get(pattern)
+                if not positions:
+                    continue
+                activities_from_pattern = self._parse_activities_by_pattern(raw_data, pattern, positions)
                 if activities_from_pattern:
                     activities.extend(activities_from_pattern)
                     break  # Użyj pierwszego działającego wzorca
@@ -323,8 +387,7 @@ class TachoParser:
             if not activities:
                 activities = self._parse_v2_binary_activities(raw_data)
 
-            # Ograniczenie i walidacja
-            activities = activities[:50]  # Limit dla bezpieczeństwa
+            # Walidacja (limit _V2_MAX_ACTIVITIES pilnowany już przy zbieraniu)
             validated_activities = []
 
             for activity in activities:
@@ -337,33 +400,35 @@ class TachoParser:
             self.logger.error(f"Error parsing V2 activities: {e}")
             return [{'error': f'Błąd parsowania aktywności V2: {str(e)}'}]
 
-    def _parse_activities_by_pattern(self, raw_data: bytes, pattern: bytes) -> List[Dict[str, Any]]:
-        """Parsuje aktywności według konkretnego wzorca"""
+    def _parse_activities_by_pattern(self, raw_data: bytes, pattern: bytes, positions: List[int]) -> List[Dict[str, Any]]:
+        """Parsuje aktywności według konkretnego wzorca (positions - kolejne wystąpienia wzorca)"""
         activities = []
-        pos = 0
+        # Bloki jako widoki na dane wejściowe (bez kopiowania)
+        view = memoryview(raw_data)
+        data_len = len(raw_data)
+        # Różne rozmiary bloków w zależności od wzorca
+        block_size = 50 if pattern == b'ACT:' else 60
+        next_pos = 0
 
-        while True:
-            pos = raw_data.find(pattern, pos)
-            if pos == -1:
-                break
+        for pos in positions:
+            if pos < next_pos:
+                continue  # Wystąpienie wewnątrz już przetworzonego bloku
 
             try:
-                # Różne rozmiary bloków w zależności od wzorca
-                block_size = 50 if pattern == b'ACT:' else 60
-
-                if pos + block_size < len(raw_data):
-                    activity_block = raw_data[pos:pos+block_size]
+                if pos + block_size < data_len:
+                    activity_block = view[pos:pos+block_size]
 
                     activity = self._parse_single_v2_activity(activity_block, pattern)
                     if activity and 'error' not in activity:
                         activities.append(activity)
+                        if len(activities) >= _V2_MAX_ACTIVITIES:
+                            break  # Dalsze bloki i tak zostałyby odcięte limitem
 
-                pos += block_size
+                next_pos = pos + block_size
 
             except Exception as e:
                 self.logger.warning(f"Error parsing activity block at position {pos}: {e}")
-                pos += len(pattern)
-                continue
+                next_pos = pos + len(pattern)
 
         return activities
 
@@ -371,24 +436,25 @@ class TachoParser:
         """Parsuje pojedynczą aktywność z bloku danych"""
         try:
             offset = len(pattern)
+            block_len = len(block)
 
-            if len(block) < offset + 16:
+            if block_len < offset + 16:
                 return None
 
             # Parsowanie zależy od wzorca
             if pattern == b'ACT:':
                 return {
-                    'start_time': self._parse_v2_timestamp(block[offset:offset+4]),
-                    'end_time': self._parse_v2_timestamp(block[offset+4:offset+8]),
-                    'activity_type': self._decode_v2_activity_type(block[offset+8] if offset+8 < len(block) else 0xFF),
-                    'duration': struct.unpack('>H', block[offset+9:offset+11])[0] if offset+11 <= len(block) else 0
+                    'start_time': self._parse_v2_timestamp(block, offset),
+                    'end_time': self._parse_v2_timestamp(block, offset + 4),
+                    'activity_type': self._decode_v2_activity_type(block[offset+8] if offset+8 < block_len else 0xFF),
+                    'duration': _U16_STRUCT.unpack_from(block, offset + 9)[0] if offset+11 <= block_len else 0
                 }
             else:
                 # Ogólny format
                 return {
-                    'start_time': self._parse_v2_timestamp(block[offset:offset+4]),
-                    'activity_type': self._decode_v2_activity_type(block[offset+4] if offset+4 < len(block) else 0xFF),
-                    'duration': struct.unpack('>H', block[offset+5:offset+7])[0] if offset+7 <= len(block) else 60,
+                    'start_time': self._parse_v2_timestamp(block, offset),
+                    'activity_type': self._decode_v2_activity_type(block[offset+4] if offset+4 < block_len else 0xFF),
+                    'duration': _U16_STRUCT.unpack_from(block, offset + 5)[0] if offset+7 <= block_len else 60,
                     'end_time': 'calculated'  # Będzie obliczone później
                 }
 
@@ -404,18 +470,28 @@ class TachoParser:
             # Szukaj bloków o charakterystycznej strukturze Smart Tacho V2
             # Często aktywności są w blokach 16-bajtowych
             block_size = 16
-
-            for i in range(0, min(len(raw_data) - block_size, 5000), block_size):
-                block = raw_data[i:i+block_size]
-
-                # Sprawdź czy blok wygląda na aktywność
-                if self._looks_like_v2_activity_block(block):
-                    activity = self._parse_binary_activity_block(block)
-                    if activity:
-                        activities.append(activity)
-
-                if len(activities) >= 30:  # Limit
-                    break
+            limit = min(len(raw_data) - block_size, 5000)
+            if limit <= 0:
+                return activities
+
+            # Kandydaci wyznaczani w C: bajty 0/4/8 kolejnych bloków (slice z krokiem),
+            # translate na flagi 0/1 i OR całych kolumn jako liczb
+            flags = 0
+            for pos in (0, 4, 8):
+                column = raw_data[pos:limit + pos:block_size].translate(_V2_ACTIVITY_BYTE_FLAGS)
+                flags |= int.from_bytes(column, 'big')
+            candidates = flags.to_bytes(-(-limit // block_size), 'big')
+
+            view = memoryview(raw_data)
+            index = candidates.find(1)
+            while index != -1:
+                i = index * block_size
+                activity = self._parse_binary_activity_block(view[i:i+block_size])
+                if activity:
+                    activities.append(activity)
+                    if len(activities) >= 30:  # Limit
+                        break
+                index = candidates.find(1, index + 1)
 
         except Exception as e:
             self.logger.error(f"Error in binary activity parsing: {e}")
@@ -427,42 +503,23 @@ class TachoParser:
         if len(block) < 16:
             return False
 
-        # Heurystyki dla Smart Tacho V2
-        try:
-            # Pierwszy bajt często to typ aktywności (0x10-0x50)
-            activity_byte = block[0]
-            if activity_byte in [0x10, 0x20, 0x30, 0x40, 0x50]:
-                return True
-
-            # Albo typ aktywności jest na pozycji 4 lub 8
-            for pos in [4, 8]:
-                if pos < len(block) and block[pos] in [0x10, 0x20, 0x30, 0x40, 0x50]:
-                    return True
-
-            return False
-        except:
-            return False
+        # Heurystyki dla Smart Tacho V2: typ aktywności (0x10-0x50) w pierwszym bajcie
+        # albo na pozycji 4 lub 8 - test przez tablicę flag zamiast przeszukiwania listy
+        flags = _V2_ACTIVITY_BYTE_FLAGS
+        return bool(flags[block[0]] or flags[block[4]] or flags[block[8]])
 
     def _parse_binary_activity_block(self, block: bytes) -> Optional[Dict[str, Any]]:
         """Parsuje blok binarny aktywności"""
         try:
-            # Próbuj różne układy danych
-            layouts = [
-                {'activity_type_pos': 0, 'timestamp_pos': 1, 'duration_pos': 5},
-                {'activity_type_pos': 4, 'timestamp_pos': 0, 'duration_pos': 8},
-                {'activity_type_pos': 8, 'timestamp_pos': 0, 'duration_pos': 12}
-            ]
+            block_len = len(block)
 
-            for layout in layouts:
+            # Próbuj różne układy danych
+            for atp, tp, dp in _V2_BINARY_ACTIVITY_LAYOUTS:
                 try:
-                    atp = layout['activity_type_pos']
-                    tp = layout['timestamp_pos']
-                    dp = layout['duration_pos']
-
-                    if atp < len(block) and tp + 4 <= len(block) and dp + 2 <= len(block):
+                    if atp < block_len and tp + 4 <= block_len and dp + 2 <= block_len:
                         activity_type = self._decode_v2_activity_type(block[atp])
-                        timestamp = self._parse_v2_timestamp(block[tp:tp+4])
-                        duration = struct.unpack('>H', block[dp:dp+2])[0]
+                        timestamp = self._parse_v2_timestamp(block, tp)
+                        duration = _U16_STRUCT.unpack_from(block, dp)[0]
 
                         if activity_type != 'unknown' and timestamp != "N/A" and 0 < duration < 1440:
                             return {
@@ -471,7 +528,7 @@ class TachoParser:
                                 'duration': duration,
                                 'end_time': 'calculated'
                             }
-                except:
+                except (struct.error, IndexError):
                     continue
 
         except Exception as e:
@@ -479,120 +536,129 @@ class TachoParser:
 
         return None
 
-    def _parse_v2_events(self, raw_data: bytes) -> List[Dict[str, Any]]:
+    def _parse_v2_events(self, raw_data: bytes,
+                         tag_positions: Optional[Dict[bytes, List[int]]] = None) -> List[Dict[str, Any]]:
         """Parsuje zdarzenia Smart Tacho V2"""
         events = []
         try:
             # Smart Tacho V2 format zdarzeń
             event_patterns = [b'EVT:', b'EVENT:', b'E:']
+            if tag_positions is None:
+                tag_positions = self._find_v2_tag_positions(raw_data)
+            view = memoryview(raw_data)
+            data_len = len(raw_data)
 
             for pattern in event_patterns:
-                pos = 0
-                while True:
-                    pos = raw_data.find(pattern, pos)
-                    if pos == -1:
-                        break
-
-                    if pos + 30 < len(raw_data):
-                        event_block = raw_data[pos:pos+30]
+                offset = len(pattern)
+                next_pos = 0
+                for pos in tag_positions.get(pattern, ()):
+                    if pos < next_pos:
+                        continue
+
+                    if pos + 30 < data_len:
+                        event_block = view[pos:pos+30]
+                        block_len = len(event_block)
+                        event_type = event_block[offset+4] if offset+4 < block_len else 0xFF
+                        event_code = event_block[offset+5] if offset+5 < block_len else 0
 
                         event = {
-                            'timestamp': self._parse_v2_timestamp(event_block[len(pattern):len(pattern)+4]),
-                            'event_type': self._decode_v2_event_type(event_block[len(pattern)+4] if len(pattern)+4 < len(event_block) else 0xFF),
-                            'event_code': event_block[len(pattern)+5] if len(pattern)+5 < len(event_block) else 0,
-                            'description': self._get_v2_event_description(
-                                event_block[len(pattern)+4] if len(pattern)+4 < len(event_block) else 0xFF,
-                                event_block[len(pattern)+5] if len(pattern)+5 < len(event_block) else 0
-                            )
+                            'timestamp': self._parse_v2_timestamp(event_block, offset),
+                            'event_type': self._decode_v2_event_type(event_type),
+                            'event_code': event_code,
+                            'description': self._get_v2_event_description(event_type, event_code)
                         }
 
                         if event['timestamp'] != "N/A":
                             events.append(event)
+                            if len(events) >= _V2_MAX_EVENTS:
+                                break
 
-                    pos += 30
+                    next_pos = pos + 30
 
                 if events:  # Użyj pierwszego działającego wzorca
                     break
 
-            return events[:30]  # Limit
+            return events  # Limit _V2_MAX_EVENTS pilnowany w pętli
 
         except Exception as e:
             self.logger.error(f"Error parsing V2 events: {e}")
             return [{'error': f'Błąd parsowania zdarzeń V2: {str(e)}'}]
 
-    def _parse_v2_speeds(self, raw_data: bytes) -> List[Dict[str, Any]]:
+    def _parse_v2_speeds(self, raw_data: bytes,
+                         tag_positions: Optional[Dict[bytes, List[int]]] = None) -> List[Dict[str, Any]]:
         """Parsuje dane prędkości Smart Tacho V2"""
         speeds = []
         try:
             # Szukaj bloków z danymi prędkości
             speed_patterns = [b'SPD:', b'SPEED:', b'VEL:']
+            if tag_positions is None:
+                tag_positions = self._find_v2_tag_positions(raw_data)
+            view = memoryview(raw_data)
+            data_len = len(raw_data)
 
             for pattern in speed_patterns:
-                pos = 0
-                while True:
-                    pos = raw_data.find(pattern, pos)
-                    if pos == -1:
-                        break
+                offset = len(pattern)
+                next_pos = 0
+                for pos in tag_positions.get(pattern, ()):
+                    if pos < next_pos:
+                        continue
 
-                    if pos + 20 < len(raw_data):
-                        speed_block = raw_data[pos:pos+20]
-                        offset = len(pattern)
+                    if pos + 20 < data_len:
+                        speed_block = view[pos:pos+20]
+                        block_len = len(speed_block)
 
-                        if offset + 8 <= len(speed_block):
+                        if offset + 8 <= block_len:
                             speed_entry = {
-                                'timestamp': self._parse_v2_timestamp(speed_block[offset:offset+4]),
-                                'speed_kmh': struct.unpack('>H', speed_block[offset+4:offset+6])[0] if offset+6 <= len(speed_block) else 0,
-                                'rpm': struct.unpack('>H', speed_block[offset+6:offset+8])[0] if offset+8 <= len(speed_block) else 0
+                                'timestamp': self._parse_v2_timestamp(speed_block, offset),
+                                'speed_kmh': _U16_STRUCT.unpack_from(speed_block, offset + 4)[0] if offset+6 <= block_len else 0,
+                                'rpm': _U16_STRUCT.unpack_from(speed_block, offset + 6)[0] if offset+8 <= block_len else 0
                             }
 
                             if speed_entry['timestamp'] != "N/A" and speed_entry['speed_kmh'] < 200:  # Realistyczny limit prędkości
                                 speeds.append(speed_entry)
+                                if len(speeds) >= _V2_MAX_SPEEDS:
+                                    break
 
-                    pos += 20
+                    next_pos = pos + 20
 
                 if speeds:  # Użyj pierwszego działającego wzorca
                     break
 
-            return speeds[:100]  # Limit
+            return speeds  # Limit _V2_MAX_SPEEDS pilnowany w pętli
 
         except Exception as e:
             self.logger.error(f"Error parsing V2 speeds: {e}")
             return [{'error': f'Błąd parsowania prędkości V2: {str(e)}'}]
 
-    def _parse_v2_timestamp(self, data: bytes) -> str:
-        """Parsuje timestamp Smart Tacho V2"""
-        try:
-            if len(data) >= 4:
-                # Smart Tacho V2 może używać różnych formatów timestampów
+    def _find_v2_tag_positions(self, raw_data: bytes) -> Dict[bytes, List[int]]:
+        """Zbiera pozycje wszystkich tagów rekordów V2 w jednym przebiegu po danych"""
+        positions = {}
+        for match in _V2_RECORD_TAG_RE.finditer(raw_data):
+            positions.setdefault(match.group(), []).append(match.start())
+        return positions
 
-                # Format 1: Unix timestamp z offsetem
-                try:
-                    timestamp = struct.unpack('>I', data[:4])[0]
-                    if timestamp > 946684800:  # Po roku 2000
-                        dt = datetime.datetime.fromtimestamp(timestamp)
-                        return dt.strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    pass
-
-                # Format 2: Timestamp z epochą od 2000
-                try:
-                    timestamp = struct.unpack('>I', data[:4])[0]
+    def _parse_v2_timestamp(self, data: bytes, offset: int = 0) -> str:
+        """Parsuje timestamp Smart Tacho V2 (4 bajty od offsetu)"""
+        try:
+            if len(data) - offset >= 4:
+                # Smart Tacho V2 może używać różnych formatów timestampów - jedno odczytanie
+                # i porównania zamiast kolejnych prób w try/except
+                timestamp = _U32_STRUCT.unpack_from(data, offset)[0]
+
+                # Format 1: Unix timestamp (po roku 2000), inaczej format 2: epoka od 2000.
+                # Wynik formatu 2 nie przekracza 2 * 946684800, więc mieści się w 2^31 - 1
+                if timestamp <= 946684800:
                     timestamp += 946684800  # Dodaj sekundy od 1970 do 2000
-                    if timestamp < 2147483647:  # Sprawdź overflow
-                        dt = datetime.datetime.fromtimestamp(timestamp)
-                        return dt.strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    pass
-
-                # Format 3: Little endian
                 try:
-                    timestamp = struct.unpack('<I', data[:4])[0]
-                    if 946684800 < timestamp < 2147483647:
-                        dt = datetime.datetime.fromtimestamp(timestamp)
-                        return dt.strftime('%Y-%m-%d %H:%M:%S')
-                except:
+                    return _format_v2_timestamp(timestamp)
+                except (OverflowError, OSError, ValueError):
                     pass
 
+                # Format 3: Little endian - tylko gdy powyższej wartości nie da się przeliczyć
+                timestamp = _U32_LE_STRUCT.unpack_from(data, offset)[0]
+                if 946684800 < timestamp < 2147483647:
+                    return _format_v2_timestamp(timestamp)
+
         except Exception as e:
             self.logger.warning(f"Error parsing V2 timestamp: {e}")
 
@@ -600,36 +666,15 @@ class TachoParser:
 
     def _decode_v2_activity_type(self, activity_byte: int) -> str:
         """Dekoduje typ aktywności Smart Tacho V2"""
-        return self.SMART_V2_ACTIVITY_TYPES.get(activity_byte, 'unknown')
+        return self.SMART_V2_ACTIVITY_TYPES_BY_BYTE[activity_byte]
 
     def _decode_v2_event_type(self, event_byte: int) -> str:
         """Dekoduje typ zdarzenia Smart Tacho V2"""
-        v2_event_types = {
-            0x01: 'speed_violation',
-            0x02: 'driving_time_violation',
-            0x03: 'card_inserted',
-            0x04: 'card_removed',
-            0x05: 'power_supply_interruption',
-            0x06: 'motion_sensor_fault',
-            0x07: 'calibration_error',
-            0x08: 'data_corruption',
-            0xFF: 'unknown'
-        }
-        return v2_event_types.get(event_byte, 'unknown')
+        return self.SMART_V2_EVENT_TYPES_BY_BYTE[event_byte]
 
     def _get_v2_event_description(self, event_type: int, event_code: int) -> str:
         """Zwraca opis zdarzenia Smart Tacho V2"""
-        descriptions = {
-            0x01: 'Przekroczenie prędkości',
-            0x02: 'Przekroczenie czasu jazdy',
-            0x03: 'Włożenie karty kierowcy',
-            0x04: 'Wyjęcie karty kierowcy',
-            0x05: 'Przerwa w zasilaniu',
-            0x06: 'Błąd sensora ruchu',
-            0x07: 'Błąd kalibracji',
-            0x08: 'Uszkodzenie danych'
-        }
-        base_desc = descriptions.get(event_type, f'Nieznane zdarzenie')
+        base_desc = self.SMART_V2_EVENT_DESCRIPTIONS_BY_BYTE[event_type]
         return f"{base_desc} (kod: {event_code})" if event_code != 0 else base_desc
 
     def _validate_v2_activity(self, activity: Dict[str, Any]) -> bool:
@@ -642,7 +687,8 @@ class TachoParser:
             if 'duration' in activity and (activity['duration'] <= 0 or activity['duration'] > 1440):
                 return False
             return True
-        except:
+        except TypeError:
+            # Aktywność spoza parsera (np. czas trwania nie będący liczbą)
             return False
 
     def _find_v2_driver_block(self, raw_data: bytes) -> Optional[Dict[str, Any]]:
@@ -659,27 +705,17 @@ class TachoParser:
 
     def _extract_v2_timestamp_alternative(self, raw_data: bytes) -> str:
         """Alternatywna metoda wyciągania timestampu z Smart Tacho V2"""
-        try:
-            # Szukaj wzorców dat w różnych formatach
-            date_patterns = [
-                rb'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})',
-                rb'(\d{2}/\d{2}/\d{4} \d{2}:\d{2})',
-                rb'(\d{8} \d{6})'  # YYYYMMDD HHMMSS
-            ]
-
-            for pattern in date_patterns:
-                match = re.search(pattern, raw_data[:1000])
-                if match:
-                    date_str = match.group(1).decode('ascii', errors='ignore')
-                    # Spróbuj sparsować
-                    for fmt in ['%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M', '%Y%m%d %H%M%S']:
-                        try:
-                            dt = datetime.datetime.strptime(date_str, fmt)
-                            return dt.strftime('%Y-%m-%d %H:%M:%S')
-                        except:
-                            continue
-        except:
-            pass
+        # Szukaj wzorców dat w różnych formatach
+        for pattern, fmt in _V2_TEXT_DATE_PATTERNS:
+            match = pattern.search(raw_data, 0, _V2_TEXT_DATE_WINDOW)
+            if match:
+                date_str = match.group(1).decode('ascii', errors='ignore')
+                # Spróbuj sparsować (dopasowanie może nie być poprawną datą)
+                try:
+                    dt = datetime.datetime.strptime(date_str, fmt)
+                    return dt.strftime('%Y-%m-%d %H:%M:%S')
+                except ValueError:
+                    continue
 
         return "N/A"
 
@@ -691,13 +727,14 @@ class TachoParser:
             return {'error': 'Plik zbyt krótki'}
 
         try:
-            # Podstawowe informacje z nagłówka
+            # Podstawowe informacje z nagłówka (długość >= 20 sprawdzona wyżej)
+            version, _, data_length = _HEADER_STRUCT.unpack_from(self.raw_data, 4)
             header = {
                 'file_type': self.raw_data[0:4].decode('ascii', errors='ignore'),
-                'version': struct.unpack('>H', self.raw_data[4:6])[0] if len(self.raw_data) >= 6 else 0,
-                'creation_time': self._parse_timestamp(self.raw_data[6:10]) if len(self.raw_data) >= 10 else "N/A",
-                'data_length': struct.unpack('>I', self.raw_data[10:14])[0] if len(self.raw_data) >= 14 else 0,
-                'signature': self.raw_data[14:20].hex() if len(self.raw_data) >= 20 else ""
+                'version': version,
+                'creation_time': self._parse_timestamp(self.raw_data, 6),
+                'data_length': data_length,
+                'signature': self.raw_data[14:20].hex()
             }
             return header
         except Exception as e:
@@ -715,12 +752,14 @@ class TachoParser:
             if offset + 78 > len(self.raw_data):
                 return {'error': 'Niepełne dane karty'}
 
+            # Pola do offsetu 78 mieszczą się w danych (sprawdzone wyżej); organ wydający
+            # (36 bajtów od 78) może być ucięty - _extract_string zwraca wtedy "N/A"
             card_data = {
                 'driver_name': self._extract_string(offset + 4, 36),
                 'license_number': self._extract_string(offset + 40, 16),
                 'card_number': self._extract_string(offset + 56, 18),
-                'card_expiry': self._parse_timestamp_bcd(offset + 74) if offset + 74 + 4 <= len(self.raw_data) else "N/A",
-                'issuing_authority': self._extract_string(offset + 78, 36) if offset + 78 + 36 <= len(self.raw_data) else "N/A"
+                'card_expiry': self._parse_timestamp_bcd(offset + 74),
+                'issuing_authority': self._extract_string(offset + 78, 36)
             }
             return card_data
         except Exception as e:
@@ -737,12 +776,14 @@ class TachoParser:
             if offset + 45 > len(self.raw_data):
                 return {'error': 'Niepełne dane pojazdu'}
 
+            # Długość >= offset + 45 sprawdzona wyżej
+            odometer_start, odometer_end, speed_limit = _VEHICLE_COUNTERS_STRUCT.unpack_from(self.raw_data, offset + 35)
             vehicle_data = {
                 'registration': self._extract_string(offset + 4, 14),
                 'vin': self._extract_string(offset + 18, 17),
-                'odometer_start': struct.unpack('>I', self.raw_data[offset + 35:offset + 39])[0] if offset + 39 <= len(self.raw_data) else 0,
-                'odometer_end': struct.unpack('>I', self.raw_data[offset + 39:offset + 43])[0] if offset + 43 <= len(self.raw_data) else 0,
-                'speed_limit': struct.unpack('>H', self.raw_data[offset + 43:offset + 45])[0] if offset + 45 <= len(self.raw_data) else 0
+                'odometer_start': odometer_start,
+                'odometer_end': odometer_end,
+                'speed_limit': speed_limit
             }
             return vehicle_data
         except Exception as e:
@@ -760,20 +801,23 @@ class TachoParser:
             if offset + 2 > len(self.raw_data):
                 return [{'error': 'Niepełne dane aktywności'}]
 
-            record_count = struct.unpack('>H', self.raw_data[offset:offset + 2])[0]
+            raw_data = self.raw_data
+            data_len = len(raw_data)
+            activity_types = self.ACTIVITY_TYPES_BY_BYTE
+            record_count = _U16_STRUCT.unpack_from(raw_data, offset)[0]
             offset += 2
 
-            for i in range(min(record_count, 1000)):  # Limit dla bezpieczeństwa
-                if offset + 8 > len(self.raw_data):
-                    break
+            # Liczba pełnych 8-bajtowych rekordów liczona raz (limit 1000 dla bezpieczeństwa);
+            # w pełnym rekordzie typ aktywności i czas trwania zawsze mieszczą się w danych
+            record_limit = min(record_count, 1000, (data_len - offset) // 8)
 
+            for _ in range(record_limit):
                 activity = {
                     'start_time': self._parse_timestamp_bcd(offset),
-                    'activity_type': self.ACTIVITY_TYPES.get(
-                        self.raw_data[offset + 4] if offset + 4 < len(self.raw_data) else 0xFF, 'unknown'
-                    ),
-                    'duration': struct.unpack('>H', self.raw_data[offset + 5:offset + 7])[0] if offset + 7 <= len(self.raw_data) else 0,
-                    'location': self._parse_location(offset + 7) if offset + 15 <= len(self.raw_data) else "N/A"
+                    'activity_type': activity_types[raw_data[offset + 4]],
+                    'duration': _U16_STRUCT.unpack_from(raw_data, offset + 5)[0],
+                    # Lokalizacja wychodzi poza rekord (8 bajtów od +7) - ostatni rekord może jej nie mieć
+                    'location': self._parse_location(offset + 7) if offset + 15 <= data_len else "N/A"
                 }
 
                 activities.append(activity)
@@ -816,87 +860,115 @@ class TachoParser:
 
         return speeds
 
+    def _index_sections(self) -> Dict[bytes, int]:
+        """Zbiera offsety pierwszych wystąpień wszystkich tagów sekcji w jednym przebiegu"""
+        offsets = {}
+        raw_data = self.raw_data
+        for match in _SECTION_TAG_RE.finditer(raw_data):
+            start = match.start()
+            tag = raw_data[start:start + 2]
+            if tag not in offsets:
+                offsets[tag] = start
+                if len(offsets) == _SECTION_TAG_COUNT:
+                    break
+        return offsets
+
     def _find_section(self, tag: bytes) -> Optional[int]:
-        """Znajduje sekcję o określonym tagu"""
-        try:
-            return self.raw_data.find(tag)
-        except:
-            return None
+        """Znajduje sekcję o określonym tagu (None, jeśli jej nie ma)"""
+        return self._section_offsets.get(tag)
 
     def _extract_string(self, offset: int, length: int) -> str:
         """Wyciąga string z danych binarnych"""
-        try:
-            if offset + length > len(self.raw_data):
-                return "N/A"
-            return self.raw_data[offset:offset + length].decode('latin-1', errors='ignore').strip('\x00')
-        except:
+        if offset + length > len(self.raw_data):
             return "N/A"
-
-    def _parse_timestamp(self, data: bytes) -> str:
-        """Parsuje timestamp Unix"""
-        try:
-            if len(data) >= 4:
-                timestamp = struct.unpack('>I', data[:4])[0]
-                if timestamp > 0:
+        # Dopełnienie NUL obcinane na bajtach - dekodowana jest tylko treść pola (latin-1 nie zgłasza błędów)
+        return self.raw_data[offset:offset + length].strip(b'\x00').decode('latin-1')
+
+    def _parse_timestamp(self, data: bytes, offset: int = 0) -> str:
+        """Parsuje timestamp Unix (4 bajty od offsetu, bez kopiowania)"""
+        if len(data) - offset >= 4:
+            timestamp = _U32_STRUCT.unpack_from(data, offset)[0]
+            if timestamp > 0:
+                try:
                     dt = datetime.datetime.fromtimestamp(timestamp)
-                    return dt.strftime('%Y-%m-%d %H:%M:%S')
-        except:
-            pass
+                except (OverflowError, OSError, ValueError):
+                    # Wartość poza zakresem obsługiwanym przez platformę
+                    return "N/A"
+                return dt.isoformat(sep=' ', timespec='seconds')
         return "N/A"
 
     def _parse_timestamp_bcd(self, offset: int) -> str:
         """Parsuje timestamp w formacie BCD"""
-        try:
-            if offset + 4 > len(self.raw_data):
-                return "N/A"
-
-            # Format BCD: YYMMDDHHMM
-            bcd_data = self.raw_data[offset:offset + 4]
-            year = 2000 + self._bcd_to_int(bcd_data[0])
-            month = self._bcd_to_int(bcd_data[1])
-            day = self._bcd_to_int(bcd_data[2])
-            hour = self._bcd_to_int(bcd_data[3] >> 4)
-            minute = self._bcd_to_int(bcd_data[3] & 0x0F) * 10
-
-            # Walidacja dat
-            if not (1 <= month <= 12 and 1 <= day <= 31 and 0 <= hour <= 23 and 0 <= minute <= 59):
-                return "N/A"
-
-            dt = datetime.datetime(year, month, day, hour, minute)
-            return dt.strftime('%Y-%m-%d %H:%M:%S')
-        except:
+        raw_data = self.raw_data
+        if offset + 4 > len(raw_data):
             return "N/A"
 
+        # 4 bajty: rok (YY), miesiąc, dzień w BCD oraz bajt czasu, w którym starszy
+        # półbajt to godzina, a młodszy dziesiątki minut (na pełne HH MM w BCD brak miejsca -
+        # kolejny bajt rekordu to już typ aktywności)
+        month = _BCD_LUT[raw_data[offset + 1]]
+        day = _BCD_LUT[raw_data[offset + 2]]
+        time_byte = raw_data[offset + 3]
+        hour = time_byte >> 4
+        minute = (time_byte & 0x0F) * 10
+
+        # Walidacja dat (godzina z półbajtu zawsze mieści się w 0-15)
+        if not (1 <= month <= 12 and 1 <= day <= _DAYS_IN_MONTH[month] and minute <= 59):
+            return "N/A"
+
+        year = 2000 + _BCD_LUT[raw_data[offset]]
+        if month == 2 and day == 29 and not (year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)):
+            return "N/A"  # 29 lutego w roku nieprzestępnym
+
+        # Składanie tekstu bez obiektu datetime - ten sam wynik co isoformat(sep=' ', timespec='seconds')
+        return f"{year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:00"
+
     def _bcd_to_int(self, bcd_byte: int) -> int:
         """Konwertuje BCD na int"""
-        return ((bcd_byte >> 4) * 10) + (bcd_byte & 0x0F)
+        return _BCD_LUT[bcd_byte]
 
     def _parse_location(self, offset: int) -> str:
         """Parsuje lokalizację GPS"""
-        try:
-            if offset + 8 > len(self.raw_data):
-                return "N/A"
-
-            # Uproszczone parsowanie lokalizacji
-            lat_raw = struct.unpack('>i', self.raw_data[offset:offset + 4])[0]
-            lon_raw = struct.unpack('>i', self.raw_data[offset + 4:offset + 8])[0]
+        if offset + 8 > len(self.raw_data):
+            return "N/A"
 
-            lat = lat_raw / 1000000.0
-            lon = lon_raw / 1000000.0
+        # Uproszczone parsowanie lokalizacji
+        lat_raw, lon_raw = _LOCATION_STRUCT.unpack_from(self.raw_data, offset)
 
-            # Walidacja współrzędnych
-            if -90 <= lat <= 90 and -180 <= lon <= 180:
-                return f"{lat:.6f},{lon:.6f}"
+        lat = lat_raw / 1000000.0
+        lon = lon_raw / 1000000.0
 
-        except:
-            pass
+        # Walidacja współrzędnych
+        if -90 <= lat <= 90 and -180 <= lon <= 180:
+            return f"{lat:.6f},{lon:.6f}"
         return "N/A"
 
 # Funkcje kompatybilne z oryginalnym API
+
+# Znacznik czasu w nazwach plików wynikowych (save_analysis, save_raw_data)
+_OUTPUT_FILENAME_TIMESTAMP_FORMAT = '%Y%m%d_%H%M%S'
+# Rozmiar porcji danych zamienianej na hex w save_raw_data
+_RAW_HEX_CHUNK_SIZE = 64 * 1024
+
+@lru_cache(maxsize=4)
+def _parse_cached(raw_data: bytes) -> Dict[str, Any]:
+    """Wynik parsowania współdzielony przez funkcje poniżej (tylko do odczytu)"""
+    return TachoParser().parse(raw_data)
+
+def _parse_for_output(raw_data: bytes) -> Dict[str, Any]:
+    """Parsuje dane dla funkcji wyświetlających/zapisujących; te same bajty parsowane są tylko raz"""
+    if isinstance(raw_data, bytes):
+        return _parse_cached(raw_data)
+    # mmap/bytearray nie są haszowalne - bez cache
+    return TachoParser().parse(raw_data)
+
+def _dumps_pretty(data) -> bytes:
+    """JSON z wcięciem 2 spacji w UTF-8 przez orjson (wywoływać tylko, gdy jest zainstalowany)"""
+    return orjson.dumps(data, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+
 def print_analysis(raw_data: bytes):
     """Drukuje analizę pliku .DDD"""
-    parser = TachoParser()
-    data = parser.parse(raw_data)
+    data = _parse_for_output(raw_data)
 
     print("=== ANALIZA PLIKU .DDD ===")
     print(f"Format: {data.get('format', 'Unknown')}")
@@ -908,14 +980,17 @@ def print_analysis(raw_data: bytes):
 
 def save_analysis(raw_data: bytes):
     """Zapisuje analizę do pliku"""
-    parser = TachoParser()
-    data = parser.parse(raw_data)
+    data = _parse_for_output(raw_data)
 
-    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    timestamp = datetime.datetime.now().strftime(_OUTPUT_FILENAME_TIMESTAMP_FORMAT)
     filename = f'analysis_{timestamp}.json'
 
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+    if orjson is None:
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+    else:
+        with open(filename, 'wb') as f:
+            f.write(_dumps_pretty(data))
 
     print(f"Analiza zapisana do: {filename}")
 
@@ -928,20 +1003,25 @@ def print_raw_data(raw_data: bytes):
 
 def save_raw_data(raw_data: bytes):
     """Zapisuje surowe dane do pliku"""
-    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    timestamp = datetime.datetime.now().strftime(_OUTPUT_FILENAME_TIMESTAMP_FORMAT)
     filename = f'{timestamp}_raw_output.txt'
 
     with open(filename, 'w') as f:
         f.write(f"Rozmiar pliku: {len(raw_data)} bajtów\n")
         f.write("Dane hex:\n")
-        f.write(raw_data.hex())
+        # Zapis porcjami - bez budowania napisu hex dwukrotnie większego od całego pliku
+        with memoryview(raw_data) as view:
+            for start in range(0, len(view), _RAW_HEX_CHUNK_SIZE):
+                f.write(view[start:start + _RAW_HEX_CHUNK_SIZE].hex())
 
     print(f"Surowe dane zapisane do: {filename}")
 
 def print_parsed_data_to_console(raw_data: bytes):
     """Drukuje przetworzone dane do konsoli"""
-    parser = TachoParser()
-    data = parser.parse(raw_data)
+    data = _parse_for_output(raw_data)
 
     print("=== PRZETWORZONE DANE ===")
-    print(json.dumps(data, indent=2, ensure_ascii=False, default=str))
+    if orjson is None:
+        print(json.dumps(data, indent=2, ensure_ascii=False, default=str))
+    else:
+        print(_dumps_pretty(data).decode('utf-8'))